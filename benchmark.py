@@ -0,0 +1,254 @@
+"""Benchmark grid for the Social Golfer Problem.
+
+Every combination of instance, strategies and seed is solved in its own
+subprocess under time and node limits, and one record per run is written
+as CSV or JSON.
+
+    python benchmark.py --groups 3 4 5 --sizes 2 3 --weeks 3 4 \\
+        --variable-strategies smallest_domain dom_wdeg --seeds 0 1 2 \\
+        --time-limit 30 --output results.csv
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import time
+
+import run
+from src.restarts import RestartPolicy, RestartSchedule
+from src.solver import (
+    SearchHook,
+    SearchInterrupted,
+    VariableStrategy,
+    VariableValueStrategy,
+)
+
+RESULTS_TEX = os.path.join(os.path.dirname(__file__), "models", "results.tex")
+
+FIELDS = [
+    "groups",
+    "size",
+    "weeks",
+    "variable_strategy",
+    "value_strategy",
+    "restart_schedule",
+    "seed",
+    "status",
+    "time",
+    "nodes",
+    "failures",
+    "restarts",
+    "propagations",
+    "nogoods_learned",
+    "cache_hits",
+    "peak_rss_kb",
+]
+
+
+class LimitHook(SearchHook):
+    """Interrupts the search after ``time_limit`` seconds or ``node_limit`` nodes."""
+
+    def __init__(self, time_limit: float | None, node_limit: int | None):
+        self.deadline = None if time_limit is None else time.time() + time_limit
+        self.node_limit = node_limit
+        self.reached: str | None = None
+
+    def on_node(self, solver, path, state) -> None:
+        if self.node_limit is not None and solver.metrics.branches >= self.node_limit:
+            self.reached = "node_limit"
+        elif self.deadline is not None and time.time() >= self.deadline:
+            self.reached = "time_limit"
+        else:
+            return
+        raise SearchInterrupted()
+
+    def on_conflict(self, solver, path) -> None:
+        self.on_node(solver, path, None)
+
+
+def results_tex_instances(path: str = RESULTS_TEX) -> list[tuple[int, int, int]]:
+    """The (groups, size, weeks) instances tabulated in ``models/results.tex``."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    groups = re.findall(r"Nombre de groupes \(G\) : (\d+)", text)
+    sizes = re.findall(r"Nombre de golfeurs par groupe \(P\) : (\d+)", text)
+    weeks = re.findall(r"Nombre de semaines \(W\) : (\d+)", text)
+    return [tuple(map(int, instance)) for instance in zip(groups, sizes, weeks)]
+
+
+def run_one(spec: dict) -> dict:
+    """Solve one configuration in this process and return its record."""
+    solver = run.build_social_golfer(
+        spec["groups"],
+        spec["size"],
+        spec["weeks"],
+        variable_strategy=VariableStrategy(spec["variable_strategy"]),
+        value_strategy=VariableValueStrategy(spec["value_strategy"]),
+        restart_policy=RestartPolicy(RestartSchedule(spec["restart_schedule"])),
+        seed=spec["seed"],
+    )
+    limits = LimitHook(spec["time_limit"], spec["node_limit"])
+    solver.add_hook(limits)
+    start = time.time()
+    solution = solver.solve()
+    elapsed = time.time() - start
+
+    if solver.interrupted:
+        status = limits.reached or "interrupted"
+    else:
+        status = "infeasible" if solution is None else "solved"
+    metrics = solver.metrics
+    record = {field: spec.get(field) for field in FIELDS}
+    record.update(
+        status=status,
+        time=round(elapsed, 4),
+        nodes=metrics.branches,
+        failures=metrics.failures,
+        restarts=metrics.restart_count,
+        propagations=metrics.propagations,
+        nogoods_learned=metrics.nogoods_learned,
+        cache_hits=metrics.cache_hits,
+        # Kilobytes on Linux
+        peak_rss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    )
+    return record
+
+
+def run_isolated(spec: dict) -> dict:
+    """Run ``spec`` in a fresh interpreter, killed if it overruns its time limit."""
+    timeout = None if spec["time_limit"] is None else spec["time_limit"] + 30
+    try:
+        process = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", json.dumps(spec)],
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        return {**{field: spec.get(field) for field in FIELDS}, "status": "killed"}
+    if process.returncode != 0:
+        return {**{field: spec.get(field) for field in FIELDS}, "status": "crashed"}
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def grid(args) -> list[dict]:
+    instances = [tuple(instance) for instance in args.instances]
+    if args.groups and args.sizes and args.weeks:
+        instances += itertools.product(args.groups, args.sizes, args.weeks)
+    if args.results_tex:
+        instances += results_tex_instances()
+    instances = list(dict.fromkeys(instances))
+    keys = ["variable_strategy", "value_strategy", "restart_schedule", "seed"]
+    return [
+        {
+            "groups": groups,
+            "size": size,
+            "weeks": weeks,
+            **dict(zip(keys, options)),
+            "time_limit": args.time_limit,
+            "node_limit": args.node_limit,
+        }
+        for (groups, size, weeks), *options in itertools.product(
+            instances,
+            args.variable_strategies,
+            args.value_strategies,
+            args.restart_schedules,
+            args.seeds,
+        )
+    ]
+
+
+def write_records(records: list[dict], path: str | None, fmt: str) -> None:
+    stream = sys.stdout if path is None else open(path, "w", newline="")
+    try:
+        if fmt == "json":
+            json.dump(records, stream, indent=2)
+            stream.write("\n")
+        else:
+            writer = csv.DictWriter(stream, fieldnames=FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(records)
+    finally:
+        if path is not None:
+            stream.close()
+
+
+def instance(text: str) -> tuple[int, int, int]:
+    """Parse GxPxW, e.g. 5x3x7."""
+    groups, size, weeks = map(int, text.lower().split("x"))
+    return groups, size, weeks
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument(
+        "--instances", nargs="*", type=instance, default=[], help="GxPxW instances"
+    )
+    parser.add_argument("--groups", nargs="*", type=int, default=[])
+    parser.add_argument("--sizes", nargs="*", type=int, default=[])
+    parser.add_argument("--weeks", nargs="*", type=int, default=[])
+    parser.add_argument(
+        "--no-results-tex",
+        dest="results_tex",
+        action="store_false",
+        help="skip the instances of models/results.tex",
+    )
+    parser.add_argument(
+        "--variable-strategies",
+        nargs="*",
+        default=[VariableStrategy.SMALLEST_DOMAIN.value],
+        choices=[strategy.value for strategy in VariableStrategy],
+    )
+    parser.add_argument(
+        "--value-strategies",
+        nargs="*",
+        default=[VariableValueStrategy.RANDOM.value],
+        choices=[strategy.value for strategy in VariableValueStrategy],
+    )
+    parser.add_argument(
+        "--restart-schedules",
+        nargs="*",
+        default=[RestartSchedule.LUBY.value],
+        choices=[schedule.value for schedule in RestartSchedule],
+    )
+    parser.add_argument("--seeds", nargs="*", type=int, default=[0])
+    parser.add_argument("--time-limit", type=float, default=60.0)
+    parser.add_argument("--node-limit", type=int, default=None)
+    parser.add_argument("--output", help="file to write, stdout by default")
+    parser.add_argument(
+        "--format",
+        choices=["csv", "json"],
+        help="output format, guessed from --output (default csv)",
+    )
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_one(json.loads(args.child))))
+        return
+
+    fmt = args.format or (
+        "json" if args.output and args.output.endswith(".json") else "csv"
+    )
+    records = []
+    for spec in grid(args):
+        record = run_isolated(spec)
+        records.append(record)
+        print(
+            f"{record['groups']}x{record['size']}x{record['weeks']} "
+            f"{record['variable_strategy']}/{record['value_strategy']}/"
+            f"{record['restart_schedule']} seed {record['seed']}: "
+            f"{record['status']} {record.get('time')}s {record.get('nodes')} nodes",
+            file=sys.stderr,
+        )
+    write_records(records, args.output, fmt)
+
+
+if __name__ == "__main__":
+    main()
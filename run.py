@@ -1,19 +1,24 @@
+import os
+
 from src import (
     SetSolver,
     CardinalityConstraint,
-    IntersectionConstraintCardinality,
     SetVariable,
     Different,
+    MeetAtMostOnce,
+    Partition,
+    to_bitset,
     VariableStrategy,
 )
 from src.constraints import LexicographicOrdering, Subset
+from src.parallel import portfolio_configurations, solve_parallel, solve_portfolio
 
 
-def solve_social_golfer(num_groups, group_size, num_weeks):
+def build_social_golfer(num_groups, group_size, num_weeks, **solver_options):
     total_golfers = num_groups * group_size
     all_players = set(range(total_golfers))
 
-    solver = SetSolver(visualize=False)
+    solver = SetSolver(visualize=False, **solver_options)
 
     # Initialize group sets for each week
     week_groups = {}
@@ -30,13 +35,10 @@ def solve_social_golfer(num_groups, group_size, num_weeks):
     for g in week_groups.values():
         solver.add_constraint(CardinalityConstraint(g.name, group_size))
 
-    # No player can be in multiple groups in same week
+    # Each week's groups partition the players
     for w in range(num_weeks):
         week_members = [f"W{w}G{i}" for i in range(num_groups)]
-
-        for i, g1 in enumerate(week_members[:-1]):
-            for g2 in week_members[i + 1 :]:
-                solver.add_constraint(IntersectionConstraintCardinality(g1, g2, 0))
+        solver.add_constraint(Partition(week_members, all_players, group_size))
 
     # Add lexicographic ordering between weeks
     # This breaks symmetry between weeks
@@ -44,27 +46,50 @@ def solve_social_golfer(num_groups, group_size, num_weeks):
     #     solver.add_constraint(LexicographicOrdering(f"W{w}G0", f"W{w+1}G0"))
 
     # Players can't be grouped together more than once
-    for w1, w2 in [
-        (i, j) for i in range(num_weeks - 1) for j in range(i + 1, num_weeks)
-    ]:
-        for g1, g2 in [(i, j) for i in range(num_groups) for j in range(num_groups)]:
-            g1_name = f"W{w1}G{g1}"
-            g2_name = f"W{w2}G{g2}"
-            solver.add_constraint(
-                IntersectionConstraintCardinality(g1_name, g2_name, 1)
-            )
+    solver.add_constraint(MeetAtMostOnce(week_groups))
 
     # Force player 0 to always be in first group of each week
     # This further breaks symmetry
     for w in range(num_weeks):
         first_group = week_groups[f"W{w}G0"]
-        first_group._lower_bound.add(0)
+        first_group.include(to_bitset([0]))
 
+    return solver
+
+
+def solve_social_golfer(num_groups, group_size, num_weeks):
+    solver = build_social_golfer(num_groups, group_size, num_weeks)
     result = solver.solve()
     print(result)
     return result
 
 
+def solve_social_golfer_portfolio(
+    num_groups, group_size, num_weeks, solvers=None, timeout=None
+):
+    model = build_social_golfer(num_groups, group_size, num_weeks)
+    configurations = portfolio_configurations(solvers or os.cpu_count() or 1)
+    result = solve_portfolio(model, configurations, timeout=timeout)
+    print(f"Winner: {result.winner} {result.configuration} in {result.elapsed:.2f}s")
+    print(result.solution)
+    return result.solution
+
+
+def solve_social_golfer_parallel(
+    num_groups, group_size, num_weeks, workers=None, timeout=None
+):
+    model = build_social_golfer(num_groups, group_size, num_weeks)
+    result = solve_parallel(model, workers=workers, timeout=timeout)
+    print(
+        f"{result.subproblems} subproblems settled, {result.resplits} re-split, "
+        f"{result.nodes} nodes in {result.elapsed:.2f}s"
+    )
+    if not result.complete:
+        print("Search incomplete")
+    print(result.solution)
+    return result.solution
+
+
 def print_solution(solution):
     if solution is None:
         print("No solution found")
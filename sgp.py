@@ -1,10 +1,11 @@
 from src.constraints import (
     CardinalityConstraint,
     IntersectionConstraintCardinality,
-    LexicographicOrdering,
+    MeetAtMostOnce,
+    Partition,
 )
 from src.solver import SetSolver
-from src.variables import SetVariable
+from src.variables import SetVariable, to_bitset
 
 
 def solve_social_golfer(num_groups, group_size, num_weeks):
@@ -28,13 +29,10 @@ def solve_social_golfer(num_groups, group_size, num_weeks):
     for g in week_groups.values():
         solver.add_constraint(CardinalityConstraint(g.name, group_size))
 
-    # No player can be in multiple groups in same week
+    # Each week's groups partition the players
     for w in range(num_weeks):
         week_members = [f"W{w}G{i}" for i in range(num_groups)]
-
-        for i, g1 in enumerate(week_members[:-1]):
-            for g2 in week_members[i + 1 :]:
-                solver.add_constraint(IntersectionConstraintCardinality(g1, g2, 0))
+        solver.add_constraint(Partition(week_members, all_players, group_size))
 
     # Add lexicographic ordering between weeks
     # This breaks symmetry between weeks
@@ -42,21 +40,13 @@ def solve_social_golfer(num_groups, group_size, num_weeks):
     #     solver.add_constraint(LexicographicOrdering(f"W{w}G0", f"W{w+1}G0"))
 
     # Players can't be grouped together more than once
-    for w1, w2 in [
-        (i, j) for i in range(num_weeks - 1) for j in range(i + 1, num_weeks)
-    ]:
-        for g1, g2 in [(i, j) for i in range(num_groups) for j in range(num_groups)]:
-            g1_name = f"W{w1}G{g1}"
-            g2_name = f"W{w2}G{g2}"
-            solver.add_constraint(
-                IntersectionConstraintCardinality(g1_name, g2_name, 1)
-            )
+    solver.add_constraint(MeetAtMostOnce(week_groups))
 
     # Force player 0 to always be in first group of each week
     # This further breaks symmetry
     # for w in range(num_weeks):
     #     first_group = week_groups[f"W{w}G0"]
-    #     first_group._lower_bound.add(0)
+    #     first_group.include(to_bitset([0]))
 
     result = solver.solve()
     print(result)
@@ -84,13 +74,10 @@ def solve_social_golfer_simple_sym_break(num_groups, group_size, num_weeks):
     for g in week_groups.values():
         solver.add_constraint(CardinalityConstraint(g.name, group_size))
 
-    # No player can be in multiple groups in same week
+    # Each week's groups partition the players
     for w in range(num_weeks):
         week_members = [f"W{w}G{i}" for i in range(num_groups)]
-
-        for i, g1 in enumerate(week_members[:-1]):
-            for g2 in week_members[i + 1 :]:
-                solver.add_constraint(IntersectionConstraintCardinality(g1, g2, 0))
+        solver.add_constraint(Partition(week_members, all_players, group_size))
 
     # Add lexicographic ordering between weeks
     # This breaks symmetry between weeks
@@ -98,21 +85,13 @@ def solve_social_golfer_simple_sym_break(num_groups, group_size, num_weeks):
     #     solver.add_constraint(LexicographicOrdering(f"W{w}G0", f"W{w+1}G0"))
 
     # Players can't be grouped together more than once
-    for w1, w2 in [
-        (i, j) for i in range(num_weeks - 1) for j in range(i + 1, num_weeks)
-    ]:
-        for g1, g2 in [(i, j) for i in range(num_groups) for j in range(num_groups)]:
-            g1_name = f"W{w1}G{g1}"
-            g2_name = f"W{w2}G{g2}"
-            solver.add_constraint(
-                IntersectionConstraintCardinality(g1_name, g2_name, 1)
-            )
+    solver.add_constraint(MeetAtMostOnce(week_groups))
 
     # Force player 0 to always be in first group of each week
     # This further breaks symmetry
     # for w in range(num_weeks):
     #     first_group = week_groups[f"W{w}G0"]
-    #     first_group._lower_bound.add(0)
+    #     first_group.include(to_bitset([0]))
 
     result = solver.solve()
     print(result)
@@ -140,47 +119,36 @@ def solve_social_golfer_advanced_sym_break(num_groups, group_size, num_weeks):
     for g in week_groups.values():
         solver.add_constraint(CardinalityConstraint(g.name, group_size))
 
-    # No player can be in multiple groups in same week
+    # Each week's groups partition the players
+    # Symmetry Breaking 2: groups within each week are ordered by their
+    # smallest player, which on disjoint groups is their lexicographic order
     for w in range(num_weeks):
         week_members = [f"W{w}G{i}" for i in range(num_groups)]
-        for i, g1 in enumerate(week_members[:-1]):
-            for g2 in week_members[i + 1 :]:
-                solver.add_constraint(IntersectionConstraintCardinality(g1, g2, 0))
+        solver.add_constraint(
+            Partition(week_members, all_players, group_size, ordered=True)
+        )
 
     # Players can't be grouped together more than once
-    for w1, w2 in [
-        (i, j) for i in range(num_weeks - 1) for j in range(i + 1, num_weeks)
-    ]:
-        for g1, g2 in [(i, j) for i in range(num_groups) for j in range(num_groups)]:
-            g1_name = f"W{w1}G{g1}"
-            g2_name = f"W{w2}G{g2}"
-            solver.add_constraint(
-                IntersectionConstraintCardinality(g1_name, g2_name, 1)
-            )
+    solver.add_constraint(MeetAtMostOnce(week_groups))
 
     # Symmetry Breaking 1: Force player 0 to always be in first group of each week
     for w in range(num_weeks):
         first_group = week_groups[f"W{w}G0"]
-        first_group._lower_bound.add(0)
-
-    # Symmetry Breaking 2: Lexicographic ordering between groups within each week
-    for w in range(num_weeks):
-        for g in range(num_groups - 1):
-            solver.add_constraint(LexicographicOrdering(f"W{w}G{g}", f"W{w}G{g+1}"))
+        first_group.include(to_bitset([0]))
 
-    # Symmetry Breaking 3: Lexicographic ordering between weeks
-    for w in range(num_weeks - 1):
-        solver.add_constraint(LexicographicOrdering(f"W{w}G0", f"W{w+1}G0"))
+    # Symmetry Breaking 3: weeks are left unordered. Their first groups share
+    # player 0 and nobody else, which a lex chain between them cannot see, so
+    # it prunes little and mostly contradicts the randomised value order
 
     # Symmetry Breaking 4: Fix first week's groups to a canonical form
     # Place first group_size players in first group
     first_group = week_groups["W0G0"]
-    first_group._lower_bound.update(range(group_size))
+    first_group.include(to_bitset(range(group_size)))
 
     # Place next group_size players in second group, etc.
     for g in range(1, num_groups):
         group = week_groups[f"W0G{g}"]
-        group._lower_bound.update(range(g * group_size, (g + 1) * group_size))
+        group.include(to_bitset(range(g * group_size, (g + 1) * group_size)))
 
     # Symmetry Breaking 5: Force player 1 to be in consecutive groups in consecutive weeks
     for w in range(num_weeks - 1):
@@ -1,3 +1,22 @@
-from .variables import SetVariable
+from .variables import Conflict, SetVariable, to_bitset, from_bitset, iter_bitset
 from .constraints import *
-from .solver import SetSolver, VariableStrategy
+from .solver import (
+    SetSolver,
+    SearchHook,
+    SearchInterrupted,
+    VariableStrategy,
+    BacktrackingStrategy,
+)
+from .restarts import RestartPolicy, RestartSchedule
+from .reporting import Reporter, SilentReporter, TextReporter, JsonLinesReporter
+from .misc import MetricTier
+from .profiling import PropagationProfiler
+from .parallel import (
+    ParallelSearchResult,
+    PortfolioResult,
+    portfolio_configurations,
+    solve_parallel,
+    solve_portfolio,
+    split_subproblems,
+)
+from .trace import DecisionTrace
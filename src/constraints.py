@@ -1,11 +1,38 @@
 from abc import ABC, abstractmethod
 
-from src.variables import SetVariable
+from src.variables import (
+    EVENT_ANY,
+    EVENT_CARD,
+    EVENT_FIXED,
+    EVENT_LOWER,
+    EVENT_UPPER,
+    Conflict,
+    SetVariable,
+    from_bitset,
+    iter_bitset,
+    join_reasons,
+    to_bitset,
+)
 
 
 class Constraint(ABC):
+    # Cost class used to order the propagation queue: cheap unary
+    # propagators run first, expensive global ones last
+    priority: int = 1
+    # True when a single call reaches the propagator's own fixpoint, so its
+    # changes need not wake it up again
+    idempotent: bool = False
+
     @abstractmethod
     def filter_domains(self, variables: dict[str, SetVariable]) -> set[str]:
+        """Narrow the bounds of the constraint's variables.
+
+        Returns the names of the variables that changed. Every bound change is
+        made through ``SetVariable.include``/``restrict`` with a reason made
+        of the literals that imply it, and failures raise ``Conflict`` with the
+        literals that cannot hold together; a trailing ``StateComputer`` uses
+        them to derive nogoods. A reason of None marks an unexplained change.
+        """
         pass
 
     @abstractmethod
@@ -16,10 +43,27 @@ class Constraint(ABC):
     def get_variables(self) -> list[str]:
         pass
 
+    def subscriptions(self) -> list[tuple[str, int]]:
+        """(variable, events) pairs: the ``EVENT_*`` flags of each variable that
+        can make this propagator prune. Other changes do not wake it up."""
+        return [(var, EVENT_ANY) for var in self.get_variables()]
+
+    def is_entailed(self, variables: dict[str, SetVariable]) -> bool:
+        """True when every assignment within the current bounds satisfies the
+        constraint, so it can neither prune nor fail again below this node.
+
+        By default only a constraint over determined variables is entailed.
+        """
+        return all(
+            variables[name].is_determined() for name in self.get_variables()
+        ) and self.evaluate(variables)
+
 
 class Union(Constraint):
     """Constraint: result = var1 ∪ var2"""
 
+    priority = 2
+
     def __init__(self, var1, var2, result):
         self.var1 = var1
         self.var2 = var2
@@ -30,35 +74,71 @@ class Union(Constraint):
 
     def filter_domains(self, variables) -> set[str]:
         changed = set()
+        var1, var2 = variables[self.var1], variables[self.var2]
+        result = variables[self.result]
 
-        new_upper = variables[self.var1]._upper_bound.union(
-            variables[self.var2]._upper_bound
-        )
-        if not variables[self.result]._upper_bound.issuperset(new_upper):
-            variables[self.result]._upper_bound = new_upper
+        # Values in neither operand
+        removed = result._upper_bound & ~(var1._upper_bound | var2._upper_bound)
+        if removed and result.exclude(
+            removed, ((self.var1, False, removed), (self.var2, False, removed))
+        ):
             changed.add(self.result)
 
-        new_lower = variables[self.var1].lower_bound.union(
-            variables[self.var2]._lower_bound
-        )
-        if not variables[self.result]._lower_bound.issuperset(new_lower):
-            variables[self.result]._lower_bound = new_lower
+        for name, var in ((self.var1, var1), (self.var2, var2)):
+            added = var._lower_bound & ~result._lower_bound
+            if added and result.include(added, ((name, True, added),)):
+                changed.add(self.result)
+
+        # max(|var1|, |var2|) ≤ |result| ≤ |var1| + |var2|
+        for var in (var1, var2):
+            if result.bound_cardinality(var.card_min, None, var.card_min_reason()):
+                changed.add(self.result)
+        if result.bound_cardinality(
+            0,
+            var1.card_max + var2.card_max,
+            join_reasons(var1.card_max_reason(), var2.card_max_reason()),
+        ):
             changed.add(self.result)
 
+        # Each operand is a subset of the result and covers what the other
+        # cannot
+        for name, var, other in ((self.var1, var1, var2), (self.var2, var2, var1)):
+            if var.bound_cardinality(
+                result.card_min - other.card_max,
+                result.card_max,
+                join_reasons(
+                    result.card_min_reason(),
+                    other.card_max_reason(),
+                    result.card_max_reason(),
+                ),
+            ):
+                changed.add(name)
+
         return changed
 
     def evaluate(self, variables) -> bool:
-        return variables[self.result].lower_bound == (
-            variables[self.var1]._lower_bound.union(variables[self.var2]._lower_bound)
+        return variables[self.result]._lower_bound == (
+            variables[self.var1]._lower_bound | variables[self.var2]._lower_bound
         )
 
     def get_variables(self) -> list[str]:
         return [self.var1, self.var2, self.result]
 
+    def subscriptions(self) -> list[tuple[str, int]]:
+        # The result's bounds only matter through its cardinality interval,
+        # which its bound changes narrow too
+        return [
+            (self.var1, EVENT_ANY),
+            (self.var2, EVENT_ANY),
+            (self.result, EVENT_LOWER | EVENT_UPPER | EVENT_CARD),
+        ]
+
 
 class Difference(Constraint):
     """Constraint: result = var1 - var2"""
 
+    priority = 2
+
     def __init__(self, var1, var2, result):
         self.var1 = var1
         self.var2 = var2
@@ -69,37 +149,60 @@ class Difference(Constraint):
 
     def filter_domains(self, variables) -> set[str]:
         changed = set()
+        var1, var2 = variables[self.var1], variables[self.var2]
+        result = variables[self.result]
 
         # Upper bound: var1 - var2 subset of var1
-        new_upper = (
-            variables[self.var1]._upper_bound - variables[self.var2]._lower_bound
-        )
-        if not variables[self.result]._upper_bound.issuperset(new_upper):
-            variables[self.result]._upper_bound = new_upper
+        removed = result._upper_bound & ~var1._upper_bound
+        if removed and result.exclude(removed, ((self.var1, False, removed),)):
+            changed.add(self.result)
+        removed = result._upper_bound & var2._lower_bound
+        if removed and result.exclude(removed, ((self.var2, True, removed),)):
             changed.add(self.result)
 
         # Lower bound: var1 - upper_bound(var2)
-        new_lower = (
-            variables[self.var1]._lower_bound - variables[self.var2]._upper_bound
-        )
-        if not variables[self.result]._lower_bound.issuperset(new_lower):
-            variables[self.result]._lower_bound = new_lower
+        added = var1._lower_bound & ~var2._upper_bound & ~result._lower_bound
+        if added and result.include(
+            added, ((self.var1, True, added), (self.var2, False, added))
+        ):
             changed.add(self.result)
 
+        # |var1| - |var2| ≤ |result| ≤ |var1|
+        if result.bound_cardinality(
+            var1.card_min - var2.card_max,
+            var1.card_max,
+            join_reasons(
+                var1.card_min_reason(), var2.card_max_reason(), var1.card_max_reason()
+            ),
+        ):
+            changed.add(self.result)
+        # The result is a subset of var1
+        if var1.bound_cardinality(result.card_min, None, result.card_min_reason()):
+            changed.add(self.var1)
+
         return changed
 
     def evaluate(self, variables) -> bool:
-        return variables[self.result].lower_bound == (
-            variables[self.var1]._lower_bound - variables[self.var2]._lower_bound
+        return variables[self.result]._lower_bound == (
+            variables[self.var1]._lower_bound & ~variables[self.var2]._lower_bound
         )
 
     def get_variables(self) -> list[str]:
         return [self.var1, self.var2, self.result]
 
+    def subscriptions(self) -> list[tuple[str, int]]:
+        return [
+            (self.var1, EVENT_ANY),
+            (self.var2, EVENT_ANY),
+            (self.result, EVENT_LOWER | EVENT_CARD),
+        ]
+
 
 class Intersection(Constraint):
     """Constraint: result = var1 ∩ var2"""
 
+    priority = 2
+
     def __init__(self, var1, var2, result):
         self.var1 = var1
         self.var2 = var2
@@ -110,37 +213,62 @@ class Intersection(Constraint):
 
     def filter_domains(self, variables) -> set[str]:
         changed = set()
+        var1, var2 = variables[self.var1], variables[self.var2]
+        result = variables[self.result]
 
-        new_upper = variables[self.var1]._upper_bound.intersection(
-            variables[self.var2]._upper_bound
-        )
-        if not variables[self.result]._upper_bound.issuperset(new_upper):
-            variables[self.result]._upper_bound = new_upper
+        for name, var in ((self.var1, var1), (self.var2, var2)):
+            removed = result._upper_bound & ~var._upper_bound
+            if removed and result.exclude(removed, ((name, False, removed),)):
+                changed.add(self.result)
+
+        added = var1._lower_bound & var2._lower_bound & ~result._lower_bound
+        if added and result.include(
+            added, ((self.var1, True, added), (self.var2, True, added))
+        ):
             changed.add(self.result)
 
-        new_lower = variables[self.var1]._lower_bound.intersection(
-            variables[self.var2]._lower_bound
-        )
-        if not variables[self.result]._lower_bound.issuperset(new_lower):
-            variables[self.result]._lower_bound = new_lower
+        # |var1| + |var2| - |var1 ∪ var2| ≤ |result| ≤ min(|var1|, |var2|)
+        union = var1._upper_bound | var2._upper_bound
+        if result.bound_cardinality(
+            var1.card_min + var2.card_min - union.bit_count(),
+            None,
+            join_reasons(
+                var1.card_min_reason(),
+                var2.card_min_reason(),
+                ((self.var1, False, ~union), (self.var2, False, ~union)),
+            ),
+        ):
             changed.add(self.result)
+        for name, var in ((self.var1, var1), (self.var2, var2)):
+            if result.bound_cardinality(0, var.card_max, var.card_max_reason()):
+                changed.add(self.result)
+            # The result is a subset of both operands
+            if var.bound_cardinality(result.card_min, None, result.card_min_reason()):
+                changed.add(name)
 
         return changed
 
     def evaluate(self, variables) -> bool:
-        return variables[self.result].lower_bound == (
-            variables[self.var1]._lower_bound.intersection(
-                variables[self.var2]._lower_bound
-            )
+        return variables[self.result]._lower_bound == (
+            variables[self.var1]._lower_bound & variables[self.var2]._lower_bound
         )
 
     def get_variables(self) -> list[str]:
         return [self.var1, self.var2, self.result]
 
+    def subscriptions(self) -> list[tuple[str, int]]:
+        return [
+            (self.var1, EVENT_ANY),
+            (self.var2, EVENT_ANY),
+            (self.result, EVENT_LOWER | EVENT_CARD),
+        ]
+
 
 class Subset(Constraint):
     """Constraint: var1 ⊆ var2"""
 
+    priority = 1
+
     def __init__(self, var1, var2):
         self.var1 = var1
         self.var2 = var2
@@ -150,41 +278,48 @@ class Subset(Constraint):
 
     def filter_domains(self, variables) -> set[str]:
         changed = set()
-        if variables[self.var2].is_determined() and not variables[
-            self.var1
-        ]._upper_bound.issubset(variables[self.var2]._upper_bound):
-            raise ValueError(
-                f"Subset constraint violated: {self.var1}={variables[self.var1]._lower_bound} not subset of {self.var2}={variables[self.var2]._upper_bound}"
-            )
+        var1, var2 = variables[self.var1], variables[self.var2]
 
-        new_upper1 = variables[self.var1]._upper_bound.intersection(
-            variables[self.var2]._upper_bound
-        )
-        if new_upper1 != variables[self.var1]._upper_bound:
-            variables[self.var1]._upper_bound = new_upper1
+        # Raises when var1's lower bound no longer fits in var2's upper bound
+        removed = var1._upper_bound & ~var2._upper_bound
+        if removed and var1.exclude(removed, ((self.var2, False, removed),)):
             changed.add(self.var1)
 
-        new_lower2 = variables[self.var2]._lower_bound.union(
-            variables[self.var1].lower_bound
-        )
-        if new_lower2 != variables[self.var2]._lower_bound:
-            variables[self.var2]._lower_bound = new_lower2
+        added = var1._lower_bound & ~var2._lower_bound
+        if added and var2.include(added, ((self.var1, True, added),)):
+            changed.add(self.var2)
+
+        if var1.bound_cardinality(0, var2.card_max, var2.card_max_reason()):
+            changed.add(self.var1)
+        if var2.bound_cardinality(var1.card_min, None, var1.card_min_reason()):
             changed.add(self.var2)
 
         return changed
 
     def evaluate(self, variables) -> bool:
-        return variables[self.var1].lower_bound.issubset(
-            variables[self.var2].lower_bound
-        )
+        lower1 = variables[self.var1]._lower_bound
+        return lower1 & ~variables[self.var2]._lower_bound == 0
+
+    def is_entailed(self, variables) -> bool:
+        upper1 = variables[self.var1]._upper_bound
+        return upper1 & ~variables[self.var2]._lower_bound == 0
 
     def get_variables(self) -> list[str]:
         return [self.var1, self.var2]
 
+    def subscriptions(self) -> list[tuple[str, int]]:
+        return [
+            (self.var1, EVENT_LOWER | EVENT_CARD),
+            (self.var2, EVENT_UPPER | EVENT_CARD),
+        ]
+
 
 class Different(Constraint):
     """Constraint: var1 ≠ var2"""
 
+    priority = 1
+    idempotent = True
+
     def __init__(self, var1, var2):
         self.var1 = var1
         self.var2 = var2
@@ -193,26 +328,46 @@ class Different(Constraint):
         return f"{self.var1} ≠ {self.var2}"
 
     def filter_domains(self, variables) -> set[str]:
+        var1, var2 = variables[self.var1], variables[self.var2]
         if (
-            variables[self.var1].is_determined()
-            and variables[self.var2].is_determined()
-            and variables[self.var1]._lower_bound == variables[self.var2]._lower_bound
+            var1.is_determined()
+            and var2.is_determined()
+            and var1._lower_bound == var2._lower_bound
         ):
-            raise ValueError(
-                f"Different constraint violated: {self.var1}={variables[self.var1]._lower_bound} = {self.var2}={variables[self.var2]._lower_bound}"
+            raise Conflict(
+                f"Different constraint violated: {self.var1}={var1.lower_bound} = {self.var2}={var2.lower_bound}",
+                (
+                    (self.var1, True, var1._lower_bound),
+                    (self.var1, False, ~var1._upper_bound),
+                    (self.var2, True, var2._lower_bound),
+                    (self.var2, False, ~var2._upper_bound),
+                ),
             )
         return set()
 
     def evaluate(self, variables) -> bool:
         return variables[self.var1]._lower_bound != variables[self.var2]._lower_bound
 
+    def is_entailed(self, variables) -> bool:
+        # One set holds a value the other cannot take
+        var1, var2 = variables[self.var1], variables[self.var2]
+        return bool(
+            var1._lower_bound & ~var2._upper_bound
+            or var2._lower_bound & ~var1._upper_bound
+        )
+
     def get_variables(self) -> list[str]:
         return [self.var1, self.var2]
 
+    def subscriptions(self) -> list[tuple[str, int]]:
+        return [(self.var1, EVENT_FIXED), (self.var2, EVENT_FIXED)]
+
 
 class IntersectionConstraintCardinality(Constraint):
     """Constraint: |var1 ∩ var2| ≤ n"""
 
+    priority = 1
+
     def __init__(self, var1, var2, max_intersection):
         self.var1 = var1
         self.var2 = var2
@@ -226,100 +381,444 @@ class IntersectionConstraintCardinality(Constraint):
         var1, var2 = variables[self.var1], variables[self.var2]
 
         # Check current lower bounds intersection
-        intersection = var1._lower_bound.intersection(var2._lower_bound)
-        if len(intersection) > self.max_intersection:
-            raise ValueError(
-                f"Intersection cardinality constraint violated: |{self.var1}={var1._lower_bound} ∩ {self.var2}={var2._lower_bound}| = {len(intersection)} > {self.max_intersection}"
+        common = var1._lower_bound & var2._lower_bound
+        size = common.bit_count()
+        if size > self.max_intersection:
+            witness = 0
+            for value in iter_bitset(common):
+                witness |= 1 << value
+                if witness.bit_count() > self.max_intersection:
+                    break
+            raise Conflict(
+                f"Intersection cardinality constraint violated: |{self.var1}={var1.lower_bound} ∩ {self.var2}={var2.lower_bound}| = {size} > {self.max_intersection}",
+                ((self.var1, True, witness), (self.var2, True, witness)),
             )
 
-        # Filter upper bounds based on potential intersections
-        for val in list(var1._upper_bound):
-            if val not in var1._lower_bound:
-                potential_intersection = len(intersection) + len(
-                    {val}.intersection(var2._lower_bound)
-                )
-                if potential_intersection > self.max_intersection:
-                    var1._upper_bound.remove(val)
-                    changed.add(self.var1)
-
-        for val in list(var2._upper_bound):
-            if val not in var2._lower_bound:
-                potential_intersection = len(intersection) + len(
-                    {val}.intersection(var1._lower_bound)
-                )
-                if potential_intersection > self.max_intersection:
-                    var2._upper_bound.remove(val)
-                    changed.add(self.var2)
+        # Once the intersection is full, no other common value may be added
+        if size == self.max_intersection:
+            for name, var, other_name, other in (
+                (self.var1, var1, self.var2, var2),
+                (self.var2, var2, self.var1, var1),
+            ):
+                for value in iter_bitset(
+                    other._lower_bound & var._upper_bound & ~var._lower_bound
+                ):
+                    bit = 1 << value
+                    var.exclude(
+                        bit, ((name, True, common), (other_name, True, common | bit))
+                    )
+                    changed.add(name)
+
+        # Values of var inside the other's lower bound are common, so at most
+        # n of them; and |var1| + |var2| ≤ |var1 ∪ var2| + n
+        union = var1._upper_bound | var2._upper_bound
+        for name, var, other_name, other in (
+            (self.var1, var1, self.var2, var2),
+            (self.var2, var2, self.var1, var1),
+        ):
+            inside = var._upper_bound & other._lower_bound
+            if var.bound_cardinality(
+                0,
+                (var._upper_bound & ~inside).bit_count()
+                + min(self.max_intersection, inside.bit_count()),
+                ((name, False, ~var._upper_bound), (other_name, True, inside)),
+            ):
+                changed.add(name)
+            if var.bound_cardinality(
+                0,
+                union.bit_count() + self.max_intersection - other.card_min,
+                join_reasons(
+                    ((self.var1, False, ~union), (self.var2, False, ~union)),
+                    other.card_min_reason(),
+                ),
+            ):
+                changed.add(name)
 
         return changed
 
     def evaluate(self, variables) -> bool:
-        intersection = variables[self.var1]._lower_bound.intersection(
-            variables[self.var2]._lower_bound
+        intersection = (
+            variables[self.var1]._lower_bound & variables[self.var2]._lower_bound
         )
-        return len(intersection) <= self.max_intersection
+        return intersection.bit_count() <= self.max_intersection
+
+    def is_entailed(self, variables) -> bool:
+        possible = variables[self.var1]._upper_bound & variables[self.var2]._upper_bound
+        return possible.bit_count() <= self.max_intersection
 
     def get_variables(self) -> list[str]:
         return [self.var1, self.var2]
 
+    def subscriptions(self) -> list[tuple[str, int]]:
+        return [(self.var1, EVENT_ANY), (self.var2, EVENT_ANY)]
 
-class CardinalityConstraint(Constraint):
-    """Constraint: |var1| = n"""
 
-    def __init__(self, var, cardinality):
-        self.var = var
-        self.cardinality = cardinality
+class Partition(Constraint):
+    """Constraint: vars are pairwise disjoint and their union is universe.
+
+    When ``size`` is given every part must also end up with ``size`` values.
+    The maximum cardinality of the parts is used to check that the free room
+    left in them can still take every value that is not placed yet.
+
+    With ``ordered`` the parts are non-empty and listed by increasing smallest
+    value. On disjoint sets this is the same as a chain of lexicographic
+    orderings, but the ordering can use that every value is placed somewhere:
+    the smallest value no earlier part can take starts the next part.
+    """
+
+    priority = 2
+
+    def __init__(self, vars, universe, size=None, ordered=False):
+        self.vars = list(vars)
+        self.universe = to_bitset(universe)
+        self.size = size
+        self.ordered = ordered
 
     def __str__(self):
-        return f"|{self.var}| = {self.cardinality}"
+        order = "ordered " if self.ordered else ""
+        return (
+            f"{{{', '.join(self.vars)}}} {order}partitions {from_bitset(self.universe)}"
+        )
 
     def filter_domains(self, variables) -> set[str]:
         changed = set()
-        var = variables[self.var]
-
-        # Check if lower bound is too large
-        if len(var._lower_bound) > self.cardinality:
-            raise ValueError(
-                f"Variable {self.var} lower bound {var._lower_bound} (size={len(var._lower_bound)}) exceeds cardinality {self.cardinality}"
+        parts = [(name, variables[name]) for name in self.vars]
+        if self.size is not None:
+            for name, var in parts:
+                if var.bound_cardinality(self.size, self.size, ()):
+                    changed.add(name)
+
+        placed = 0
+        for name, var in parts:
+            overlap = var._lower_bound & placed
+            if overlap:
+                overlap &= -overlap
+                other = next(n for n, v in parts if v._lower_bound & overlap)
+                raise Conflict(
+                    f"Partition violated: {from_bitset(overlap)} is in both {other} and {name}",
+                    ((other, True, overlap), (name, True, overlap)),
+                )
+            placed |= var._lower_bound
+
+        # A placed value leaves the upper bound of every other part
+        for name, var in parts:
+            if var.restrict(self.universe, ()):
+                changed.add(name)
+            taken = var._upper_bound & placed & ~var._lower_bound
+            if not taken:
+                continue
+            for other, other_var in parts:
+                removed = taken & other_var._lower_bound
+                if removed:
+                    var.exclude(removed, ((other, True, removed),))
+                    changed.add(name)
+
+        # Values that no part can take, or that only one part can take
+        covered = covered_twice = 0
+        for _, var in parts:
+            covered_twice |= covered & var._upper_bound
+            covered |= var._upper_bound
+        uncovered = self.universe & ~covered
+        if uncovered:
+            uncovered &= -uncovered
+            raise Conflict(
+                f"Partition violated: no part of {self.vars} can take {from_bitset(uncovered)}",
+                tuple((name, False, uncovered) for name in self.vars),
             )
-
-        # Check if upper bound is too small to reach cardinality
-        if len(var._upper_bound) < self.cardinality:
-            raise ValueError(
-                f"Variable {self.var} upper bound {var._upper_bound} (size={len(var._upper_bound)}) too small to reach cardinality {self.cardinality}"
+        for name, var in parts:
+            forced = var.undetermined & ~covered_twice
+            if forced and var.include(
+                forced,
+                tuple((other, False, forced) for other in self.vars if other != name),
+            ):
+                changed.add(name)
+
+        if self.ordered:
+            changed |= self._order_parts(parts)
+
+        # Bounds may have settled on their cardinality along the way
+        placed = 0
+        for _, var in parts:
+            placed |= var._lower_bound
+        unplaced = (self.universe & ~placed).bit_count()
+        room = sum(
+            min(var.card_max - var._lower_bound.bit_count(), var.domain_size())
+            for _, var in parts
+        )
+        if room < unplaced:
+            raise Conflict(
+                f"Partition violated: {unplaced} unplaced values but room for {room} in {self.vars}",
+                join_reasons(
+                    *(
+                        (
+                            (name, True, var._lower_bound),
+                            (name, False, ~var._upper_bound),
+                        )
+                        for name, var in parts
+                    ),
+                    *(var.card_max_reason() for _, var in parts),
+                ),
             )
 
-        # If lower bound reaches cardinality, fix the set
-        if len(var._lower_bound) == self.cardinality:
-            if var._upper_bound != var._lower_bound:
-                var._upper_bound = var._lower_bound.copy()
-                changed.add(self.var)
-            return changed
+        return changed
+
+    def _order_parts(self, parts) -> set[str]:
+        """Bound the smallest value of every part by those of its neighbours.
+
+        A forward pass over the upper bounds finds the lowest value each part
+        can start with, and a backward pass the highest one, from its lower
+        bound, the next part and the values earlier parts cannot take.
+        """
+        changed = set()
+        lows, low_reasons = [], []
+        low, reason = -1, ()
+        for name, var in parts:
+            if var.bound_cardinality(1, None, ()):
+                changed.add(name)
+            # Values up to the previous part's start are left to earlier parts
+            before = (1 << (low + 1)) - 1
+            if var._upper_bound & before and var.exclude(before, reason):
+                changed.add(name)
+            if not var._upper_bound:
+                raise Conflict(
+                    f"Partition violated: {name} cannot start after {low}",
+                    reason + ((name, False, ~var._upper_bound),),
+                )
+            low = (var._upper_bound & -var._upper_bound).bit_length() - 1
+            below = ~var._upper_bound & ((1 << low) - 1)
+            if below:
+                reason += ((name, False, below),)
+            lows.append(low)
+            low_reasons.append(reason)
+
+        covered = [0]
+        for _, var in parts:
+            covered.append(covered[-1] | var._upper_bound)
+        bound, reason = self.universe.bit_length(), ()
+        for index in reversed(range(len(parts))):
+            name, var = parts[index]
+            # Every part after this one starts later, and so does the part of
+            # a value no earlier part can take
+            first = var._lower_bound & -var._lower_bound
+            if first and first.bit_length() - 1 < bound:
+                bound, reason = first.bit_length() - 1, ((name, True, first),)
+            free = self.universe & ~covered[index]
+            free &= -free
+            if free and free.bit_length() - 1 < bound:
+                bound = free.bit_length() - 1
+                reason = tuple((other, False, free) for other, _ in parts[:index])
+            up_to = (2 << bound) - 1 if bound >= 0 else 0
+            if ~var._upper_bound & up_to:
+                reason += ((name, False, ~var._upper_bound & up_to),)
+            high = (var._upper_bound & up_to).bit_length() - 1
+            if high < lows[index]:
+                raise Conflict(
+                    f"Partition violated: {name} cannot start between {lows[index]} and {bound}",
+                    join_reasons(low_reasons[index], reason),
+                )
+            if high == lows[index] and var.include(
+                1 << high, join_reasons(low_reasons[index], reason)
+            ):
+                changed.add(name)
+            bound = high - 1
+        return changed
+
+    def evaluate(self, variables) -> bool:
+        union = 0
+        start = -1
+        for name in self.vars:
+            lower = variables[name]._lower_bound
+            if union & lower:
+                return False
+            if self.size is not None and lower.bit_count() != self.size:
+                return False
+            if self.ordered:
+                if (lower & -lower).bit_length() - 1 <= start:
+                    return False
+                start = (lower & -lower).bit_length() - 1
+            union |= lower
+        return union == self.universe
+
+    def get_variables(self) -> list[str]:
+        return list(self.vars)
+
+    def subscriptions(self) -> list[tuple[str, int]]:
+        return [(name, EVENT_LOWER | EVENT_UPPER | EVENT_CARD) for name in self.vars]
 
-        if len(var._upper_bound) == self.cardinality:
-            if var._lower_bound != var._upper_bound:
-                var._lower_bound = var._upper_bound.copy()
-                changed.add(self.var)
-            return changed
 
-        remaining_needed = self.cardinality - len(var._lower_bound)
-        optional_values = var._upper_bound - var._lower_bound
+class MeetAtMostOnce(Constraint):
+    """Constraint: |vi ∩ vj| ≤ 1 for all i ≠ j, so two values share at most one set.
 
-        if len(optional_values) == remaining_needed:
-            var._lower_bound.update(optional_values)
-            changed.add(self.var)
+    One propagator stands for every pairwise intersection constraint: a row
+    per value holds, as a bitmask, the values it already shares a lower bound
+    with, and a value is removed from any set whose lower bound holds someone
+    it has met.
+    """
+
+    priority = 2
+
+    def __init__(self, vars):
+        self.vars = list(vars)
+
+    def __str__(self):
+        return f"values meet at most once in {{{', '.join(self.vars)}}}"
+
+    def filter_domains(self, variables) -> set[str]:
+        changed = set()
+        met: dict[int, int] = {}
+        # Value -> (set, lower bound) of the sets it meets others in
+        met_in: dict[int, list[tuple[str, int]]] = {}
+
+        for name in self.vars:
+            lower = variables[name]._lower_bound
+            if lower & (lower - 1) == 0:
+                continue
+            for value in iter_bitset(lower):
+                bit = 1 << value
+                again = met.get(value, 0) & lower
+                if again:
+                    again &= -again
+                    other = next(n for n, l in met_in[value] if l & again)
+                    raise Conflict(
+                        f"{from_bitset(bit | again)} meet in both {other} and {name}",
+                        ((other, True, bit | again), (name, True, bit | again)),
+                    )
+                met[value] = met.get(value, 0) | (lower & ~bit)
+                met_in.setdefault(value, []).append((name, lower))
+
+        for name in self.vars:
+            var = variables[name]
+            candidates = var.undetermined
+            if not candidates:
+                continue
+            for value in iter_bitset(var._lower_bound):
+                if not met.get(value, 0) & candidates:
+                    continue
+                bit = 1 << value
+                for other, other_lower in met_in[value]:
+                    removed = other_lower & candidates
+                    if removed:
+                        var.exclude(
+                            removed,
+                            ((name, True, bit), (other, True, removed | bit)),
+                        )
+                        candidates &= ~removed
+                        changed.add(name)
 
         return changed
 
     def evaluate(self, variables) -> bool:
-        return len(variables[self.var].lower_bound) == self.cardinality
+        met: dict[int, int] = {}
+        for name in self.vars:
+            lower = variables[name]._lower_bound
+            for value in iter_bitset(lower):
+                if met.get(value, 0) & lower:
+                    return False
+            for value in iter_bitset(lower):
+                met[value] = met.get(value, 0) | (lower & ~(1 << value))
+        return True
+
+    def get_variables(self) -> list[str]:
+        return list(self.vars)
+
+    def subscriptions(self) -> list[tuple[str, int]]:
+        return [(name, EVENT_LOWER) for name in self.vars]
+
+
+class CardinalityConstraint(Constraint):
+    """Constraint: |var1| = n"""
+
+    priority = 0
+    idempotent = True
+
+    def __init__(self, var, cardinality):
+        self.var = var
+        self.cardinality = cardinality
+
+    def __str__(self):
+        return f"|{self.var}| = {self.cardinality}"
+
+    def filter_domains(self, variables) -> set[str]:
+        # The variable's cardinality interval does the rest: it fails on a
+        # lower bound too large or an upper bound too small, and fixes the set
+        # once either bound reaches the cardinality
+        var = variables[self.var]
+        if var.bound_cardinality(self.cardinality, self.cardinality, ()):
+            return {self.var}
+        return set()
+
+    def evaluate(self, variables) -> bool:
+        return variables[self.var]._lower_bound.bit_count() == self.cardinality
 
     def get_variables(self) -> list[str]:
         return [self.var]
 
+    def subscriptions(self) -> list[tuple[str, int]]:
+        return [(self.var, EVENT_LOWER | EVENT_UPPER)]
+
+
+# Automaton reading the characteristic vectors of two sets one value at a
+# time, as (x, y) bit pairs, and accepting when the first set is smaller in
+# lexicographic order of their sorted elements. Let d be the first value in
+# exactly one set: if it is in the first set, the second must hold a larger
+# value; if it is in the second, the first must hold none.
+_LEX_EQUAL = 1  # no difference yet
+_LEX_NEED_Y = 2  # d in the first set, waiting for a later value of the second
+_LEX_NO_X = 4  # d in the second set, the first may not take any later value
+_LEX_LESS = 8  # decided: first < second
+_LEX_DEAD = 16
+_LEX_ACCEPTING = _LEX_NO_X | _LEX_LESS
+_LEX_STATES = (_LEX_EQUAL, _LEX_NEED_Y, _LEX_NO_X, _LEX_LESS, _LEX_DEAD)
+
+
+def _lex_delta(state: int, x: int, y: int) -> int:
+    if state == _LEX_EQUAL:
+        if x == y:
+            return _LEX_EQUAL
+        return _LEX_NEED_Y if x else _LEX_NO_X
+    if state == _LEX_NEED_Y:
+        return _LEX_LESS if y else _LEX_NEED_Y
+    if state == _LEX_NO_X:
+        return _LEX_DEAD if x else _LEX_NO_X
+    return state
+
+
+def _lex_tables() -> tuple[list, list]:
+    # next[states][xs][ys] and prev[states][xs][ys] for sets of states and
+    # sets of bit values (1: bit may be 0, 2: bit may be 1)
+    size = 1 + sum(_LEX_STATES)
+    next_ = [[[0] * 4 for _ in range(4)] for _ in range(size)]
+    prev = [[[0] * 4 for _ in range(4)] for _ in range(size)]
+    for states in range(size):
+        for xs in range(4):
+            for ys in range(4):
+                for state in _LEX_STATES:
+                    for x in (0, 1):
+                        for y in (0, 1):
+                            if not (xs >> x & 1 and ys >> y & 1):
+                                continue
+                            target = _lex_delta(state, x, y)
+                            if states & state:
+                                next_[states][xs][ys] |= target
+                            if states & target:
+                                prev[states][xs][ys] |= state
+    return next_, prev
+
+
+_LEX_NEXT, _LEX_PREV = _lex_tables()
+
 
 class LexicographicOrdering(Constraint):
-    """Constraint: var1 < var2 in lexicographic order"""
+    """Constraint: var1 < var2 in lexicographic order of their sorted elements.
+
+    The order is recognised by a small automaton over the characteristic
+    vectors of the two sets, so a forward and a backward pass over the values
+    of the upper bounds find, in linear time, every value that can be in (or
+    out of) either set in some solution: the bounds of both sides are pruned
+    to bound consistency.
+    """
+
+    priority = 3
 
     def __init__(self, var1, var2):
         self.var1 = var1
@@ -328,61 +827,98 @@ class LexicographicOrdering(Constraint):
     def __str__(self):
         return f"{self.var1} <lex {self.var2}"
 
-    def _compare_sets_lex(self, set1: set[int], set2: set[int]) -> bool:
-        list1 = sorted(set1)
-        list2 = sorted(set2)
-
-        for i in range(min(len(list1), len(list2))):
-            if list1[i] < list2[i]:
-                return True
-            if list1[i] > list2[i]:
-                return False
-        return len(list1) < len(list2)
-
-    def _can_be_greater_lex(self, set1: set[int], set2: set[int]) -> bool:
-        list1 = sorted(set1)
-        list2 = sorted(set2)
-
-        for i in range(min(len(list1), len(list2))):
-            if list1[i] > list2[i]:
-                return True
-            if list1[i] < list2[i]:
-                return False
-        return len(list1) > len(list2)
-
-    def _can_be_less_lex(self, set1: set[int], set2: set[int]) -> bool:
-        list1 = sorted(set1)
-        list2 = sorted(set2)
-
-        for i in range(min(len(list1), len(list2))):
-            if list1[i] < list2[i]:
-                return True
-            if list1[i] > list2[i]:
-                return False
-        return len(list1) < len(list2)
+    @staticmethod
+    def _compare_sets_lex(set1: int, set2: int) -> bool:
+        diff = set1 ^ set2
+        if not diff:
+            return False
+        shift = (diff & -diff).bit_length()
+        if set1 & diff & -diff:
+            return set2 >> shift != 0
+        return set1 >> shift == 0
+
+    def _positions(self, var1: SetVariable, var2: SetVariable):
+        """(bit, xs, ys) for each value either set may hold, in increasing order.
+
+        Values out of both upper bounds read (0, 0), which leaves every state
+        but the first unchanged, so they are skipped.
+        """
+        positions = []
+        for value in iter_bitset(var1._upper_bound | var2._upper_bound):
+            bit = 1 << value
+            xs = 2 if var1._lower_bound & bit else 3 if var1._upper_bound & bit else 1
+            ys = 2 if var2._lower_bound & bit else 3 if var2._upper_bound & bit else 1
+            positions.append((bit, xs, ys))
+        return positions
+
+    def _reason(self, var1: SetVariable, var2: SetVariable):
+        return (
+            (self.var1, True, var1._lower_bound),
+            (self.var1, False, ~var1._upper_bound),
+            (self.var2, True, var2._lower_bound),
+            (self.var2, False, ~var2._upper_bound),
+        )
 
     def filter_domains(self, variables) -> set[str]:
         changed = set()
         var1, var2 = variables[self.var1], variables[self.var2]
+        positions = self._positions(var1, var2)
+
+        # An empty first set is below any non-empty one, whatever follows
+        forward = [_LEX_EQUAL]
+        for _, xs, ys in positions:
+            forward.append(_LEX_NEXT[forward[-1]][xs][ys])
+        if not forward[-1] & _LEX_ACCEPTING:
+            raise Conflict(
+                f"Lexicographic ordering constraint cannot be satisfied: {var1} ≥lex {var2}",
+                self._reason(var1, var2),
+            )
 
-        for val in list(var2._upper_bound):
-            if not self._can_be_greater_lex(
-                var2._lower_bound | {val}, var1._lower_bound
+        reason = self._reason(var1, var2)
+        backward = _LEX_ACCEPTING
+        for k in range(len(positions) - 1, -1, -1):
+            bit, xs, ys = positions[k]
+            before = forward[k]
+            for var, name, own, other, is_first in (
+                (var1, self.var1, xs, ys, True),
+                (var2, self.var2, ys, xs, False),
             ):
-                var2._upper_bound.remove(val)
-                changed.add(self.var2)
-
-        if not self._compare_sets_lex(var1._lower_bound, var2._upper_bound):
-            raise ValueError(
-                f"Lexicographic ordering constraint cannot be satisfied: {self.var1}={var1._lower_bound} ≥lex {self.var2}={var2._upper_bound}"
-            )
+                if own != 3:
+                    continue
+                for value, only in ((0, 1), (1, 2)):
+                    row = (
+                        _LEX_NEXT[before][only][other]
+                        if is_first
+                        else _LEX_NEXT[before][other][only]
+                    )
+                    if not row & backward:
+                        if value:
+                            var.exclude(bit, reason)
+                        else:
+                            var.include(bit, reason)
+                        changed.add(name)
+            backward = _LEX_PREV[backward][xs][ys]
 
         return changed
 
+    def is_entailed(self, variables) -> bool:
+        """True when every assignment of the current bounds satisfies the order."""
+        var1, var2 = variables[self.var1], variables[self.var2]
+        rejecting = _LEX_EQUAL | _LEX_NEED_Y | _LEX_DEAD
+        for _, xs, ys in reversed(self._positions(var1, var2)):
+            rejecting = _LEX_PREV[rejecting][xs][ys]
+        return not rejecting & _LEX_EQUAL
+
     def evaluate(self, variables) -> bool:
         return self._compare_sets_lex(
-            variables[self.var1].lower_bound, variables[self.var2].lower_bound
+            variables[self.var1]._lower_bound, variables[self.var2]._lower_bound
         )
 
     def get_variables(self) -> list[str]:
         return [self.var1, self.var2]
+
+    def subscriptions(self) -> list[tuple[str, int]]:
+        return [
+            (self.var1, EVENT_LOWER | EVENT_UPPER),
+            (self.var2, EVENT_LOWER | EVENT_UPPER),
+        ]
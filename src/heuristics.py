@@ -0,0 +1,98 @@
+from typing import Callable, Iterable
+
+from src.variables import SetVariable
+
+
+class VariableHeap:
+    """Indexed binary min-heap of the undetermined variables of a store.
+
+    Variables are ordered by ``key(variable)``, which must be unique per
+    variable (end it with the variable's index to break ties). Only the
+    variables passed to ``update`` are re-ranked, entering or leaving the
+    heap as they become undetermined or determined, so the best variable
+    is available in constant time once the changes of a node are applied.
+    """
+
+    def __init__(
+        self,
+        variables: dict[str, SetVariable],
+        key: Callable[[SetVariable], tuple],
+    ):
+        self.variables = variables
+        self.key = key
+        self._heap: list[str] = []
+        self._keys: dict[str, tuple] = {}
+        self._positions: dict[str, int] = {}
+        self.update(variables)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def top(self) -> str | None:
+        return self._heap[0] if self._heap else None
+
+    def update(self, names: Iterable[str]) -> None:
+        """Re-rank ``names`` after their domains changed."""
+        for name in names:
+            var = self.variables[name]
+            if var.is_determined():
+                if name in self._positions:
+                    self._remove(name)
+            elif name in self._positions:
+                key = self.key(var)
+                old = self._keys[name]
+                if key != old:
+                    self._keys[name] = key
+                    if key < old:
+                        self._sift_up(self._positions[name])
+                    else:
+                        self._sift_down(self._positions[name])
+            else:
+                self._keys[name] = self.key(var)
+                self._positions[name] = len(self._heap)
+                self._heap.append(name)
+                self._sift_up(len(self._heap) - 1)
+
+    def _remove(self, name: str) -> None:
+        heap = self._heap
+        i = self._positions.pop(name)
+        del self._keys[name]
+        last = heap.pop()
+        if i < len(heap):
+            heap[i] = last
+            self._positions[last] = i
+            self._sift_up(i)
+            self._sift_down(self._positions[last])
+
+    def _sift_up(self, i: int) -> None:
+        heap, keys, positions = self._heap, self._keys, self._positions
+        name = heap[i]
+        key = keys[name]
+        while i:
+            parent = (i - 1) >> 1
+            if keys[heap[parent]] <= key:
+                break
+            heap[i] = heap[parent]
+            positions[heap[i]] = i
+            i = parent
+        heap[i] = name
+        positions[name] = i
+
+    def _sift_down(self, i: int) -> None:
+        heap, keys, positions = self._heap, self._keys, self._positions
+        size = len(heap)
+        name = heap[i]
+        key = keys[name]
+        while True:
+            child = 2 * i + 1
+            if child >= size:
+                break
+            if child + 1 < size and keys[heap[child + 1]] < keys[heap[child]]:
+                child += 1
+            if keys[heap[child]] >= key:
+                break
+            heap[i] = heap[child]
+            positions[heap[i]] = i
+            i = child
+        heap[i] = name
+        positions[name] = i
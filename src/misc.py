@@ -1,13 +1,23 @@
-from collections import deque
+from collections import OrderedDict, deque
 from dataclasses import dataclass
-from enum import Enum, auto
+from enum import Enum, Flag, auto
+import functools
+import heapq
+import sys
 import time
 import tracemalloc
-from typing import Callable
+from typing import Callable, NamedTuple, Sequence, TextIO
 
-import psutil
 from src.constraints import Constraint
-from src.variables import SetVariable
+from src.profiling import PropagationProfiler
+from src.variables import (
+    EVENT_ANY,
+    EVENT_FIXED,
+    Conflict,
+    Reason,
+    SetVariable,
+    iter_bitset,
+)
 
 
 class OperationType(Enum):
@@ -45,70 +55,276 @@ class NoGood:
         return " ∧ ".join(parts)
 
 
+class MetricTier(Flag):
+    """Optional, costlier metrics; none are collected by default."""
+
+    NONE = 0
+    MEMORY = auto()  # tracemalloc current and peak usage
+    RSS = auto()  # process resident set size growth, needs psutil
+    FREQUENCIES = auto()  # times each value was tried for each variable
+    PROPAGATORS = auto()  # calls, time and pruning per constraint class
+    PROPAGATOR_INSTANCES = auto()  # the same, per constraint instance
+    ALL = MEMORY | RSS | FREQUENCIES | PROPAGATORS
+
+
 class SolverMetrics:
-    def __init__(self):
-        tracemalloc.start()
+    def __init__(self, tiers: MetricTier = MetricTier.NONE):
+        self.tiers = tiers
+        if MetricTier.MEMORY in tiers:
+            tracemalloc.start()
         self.start_time = time.time()
         self.solution: dict[str, set[int]] = {}
         self.nogoods_learned = 0
+        self.nogoods_kept = 0
+        self.nogoods_deleted = 0
+        self.nogoods_rejected = 0
+        self.nogood_reductions = 0
         self.nogood_hits = 0
         self.var_value_frequency: dict[str, dict[int, int]] = {}
+        # Mean impact of including each value, and how many were measured
+        self.var_value_impact: dict[str, dict[int, tuple[float, int]]] = {}
         self.branches = 0
         self.max_depth = 0
         self.global_max_depth = 0
         self.current_depth = 0
         self.restart_count = 0
+        self.failures = 0
+        self.run_failures = 0  # since the last restart
+        self.restart_cutoff = 0  # failures allowed in this run, 0 if unlimited
         self.random_choices = 0
         self.global_random_choices = 0
-        self.initial_memory = psutil.Process().memory_info().rss
+        self.initial_memory = self._rss() if MetricTier.RSS in tiers else 0
         self.max_depth_hits: float = 0
+        self.propagations = 0
+        self.retired_constraints = 0
         self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_evictions = 0
+        self.cache_size = 0
+        self.cache_bytes = 0
         self.skipped_propagations = 0
+        self.profiler: PropagationProfiler | None = None
+        if tiers & (MetricTier.PROPAGATORS | MetricTier.PROPAGATOR_INSTANCES):
+            self.profiler = PropagationProfiler(
+                per_instance=MetricTier.PROPAGATOR_INSTANCES in tiers
+            )
 
-    def pretty_print(self, interrupted=False):
-        print("\n=== Solver Statistics ===")
-        print(f"Time elapsed: {time.time() - self.start_time:.2f} seconds")
-        print(f"Number of branches: {self.branches}")
-        print(f"Maximum search depth: {self.global_max_depth}")
-        print(f"# of restarts: {self.restart_count}")
-        print(f"Random choices made : {self.global_random_choices}")
-        print(f"Cache hits : {self.cache_hits}")
-        print(f"No-goods Learned : {self.nogoods_learned}")
-
-        print(f"No-goods hits : {self.nogood_hits}")
-
-        print(f"Skipped propagations: {self.skipped_propagations}")
-
-        current, peak = tracemalloc.get_traced_memory()
-        print(f"Current memory usage: {current / 10**6:.1f} MB")
-        print(f"Peak memory usage: {peak / 10**6:.1f} MB")
-        print(
-            f"Memory increase: {(psutil.Process().memory_info().rss - self.initial_memory) / 1024 / 1024:.1f} MB"
+    @staticmethod
+    def _rss() -> int:
+        import psutil
+
+        return psutil.Process().memory_info().rss
+
+    def as_dict(self) -> dict:
+        """Counters as plain values, for machine-readable reports."""
+        record = {
+            name: value
+            for name, value in vars(self).items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+        }
+        record["elapsed"] = time.time() - self.start_time
+        if MetricTier.MEMORY in self.tiers:
+            record["memory_current"], record["memory_peak"] = (
+                tracemalloc.get_traced_memory()
+            )
+        if MetricTier.RSS in self.tiers:
+            record["rss_increase"] = self._rss() - self.initial_memory
+        if self.profiler is not None:
+            record["propagators"] = self.profiler.as_dict()
+        return record
+
+    def pretty_print(self, interrupted=False, file: TextIO | None = None):
+        emit = functools.partial(print, file=file)
+        emit("\n=== Solver Statistics ===")
+        emit(f"Time elapsed: {time.time() - self.start_time:.2f} seconds")
+        emit(f"Number of branches: {self.branches}")
+        emit(f"Maximum search depth: {self.global_max_depth}")
+        emit(f"# of restarts: {self.restart_count}")
+        emit(f"Failures : {self.failures}")
+        if self.restart_cutoff:
+            emit(
+                f"Failures in the last run : {self.run_failures} (cut-off {self.restart_cutoff})"
+            )
+        emit(f"Random choices made : {self.global_random_choices}")
+        emit(f"Propagator calls : {self.propagations}")
+        emit(f"Entailed constraints retired : {self.retired_constraints}")
+        emit(f"Cache hits : {self.cache_hits}")
+        emit(f"Cache misses (full replays) : {self.cache_misses}")
+        emit(f"Cache evictions : {self.cache_evictions}")
+        emit(f"Cache size : {self.cache_size} states")
+        if self.cache_bytes:
+            emit(f"Cache footprint : {self.cache_bytes / 10**6:.1f} MB")
+        emit(f"No-goods Learned : {self.nogoods_learned}")
+        emit(f"No-goods kept : {self.nogoods_kept}")
+        emit(
+            f"No-goods deleted : {self.nogoods_deleted} in {self.nogood_reductions} reductions"
         )
+        if self.nogoods_rejected:
+            emit(f"No-goods rejected (too long) : {self.nogoods_rejected}")
+
+        emit(f"No-goods hits : {self.nogood_hits}")
+
+        emit(f"Skipped propagations: {self.skipped_propagations}")
+
+        if MetricTier.MEMORY in self.tiers:
+            current, peak = tracemalloc.get_traced_memory()
+            emit(f"Current memory usage: {current / 10**6:.1f} MB")
+            emit(f"Peak memory usage: {peak / 10**6:.1f} MB")
+        if MetricTier.RSS in self.tiers:
+            emit(
+                f"Memory increase: {(self._rss() - self.initial_memory) / 1024 / 1024:.1f} MB"
+            )
+        if self.profiler is not None:
+            emit("\n=== Propagators ===")
+            emit(self.profiler.table())
 
         if not interrupted and self.solution:
-            print("\n=== Solution Found ===")
+            emit("\n=== Solution Found ===")
         elif not interrupted:
-            print("\n=== No solution found ===")
+            emit("\n=== No solution found ===")
+
+
+class PropagationQueue:
+    """Pending propagators, without duplicates, cheapest cost class first.
+
+    Constraints are bucketed by their ``priority``; a constraint that is
+    already pending, or one of ``retired``, is not enqueued again.
+    """
+
+    def __init__(self, levels: int, constraints=(), retired=frozenset()):
+        self._buckets = [deque() for _ in range(levels)]
+        self._pending: set[Constraint] = set()
+        self._retired = retired
+        self.extend(constraints)
+
+    def __bool__(self) -> bool:
+        return bool(self._pending)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def extend(self, constraints, skip: Constraint | None = None) -> None:
+        pending = self._pending
+        retired = self._retired
+        buckets = self._buckets
+        for constraint in constraints:
+            if (
+                constraint is not skip
+                and constraint not in pending
+                and constraint not in retired
+            ):
+                pending.add(constraint)
+                buckets[constraint.priority].append(constraint)
+
+    def pop(self) -> Constraint:
+        for bucket in self._buckets:
+            if bucket:
+                constraint = bucket.popleft()
+                self._pending.discard(constraint)
+                return constraint
+        raise IndexError("pop from an empty propagation queue")
+
+
+class CacheEntry(NamedTuple):
+    state: dict[str, SetVariable]
+    size: int  # estimated bytes, 0 when the cache is not bounded in bytes
+    retired: frozenset[Constraint]  # entailed constraints of the state
+
+
+class CachePolicy(Enum):
+    LRU = "lru"
+    # Keep only the cached states of the current node's ancestors
+    BRANCH = "branch"
 
 
 class StateComputer:
+    """Computes the propagated state reached by a path of operations.
+
+    In the default mode every state is a fresh dict of ``SetVariable`` copies,
+    rebuilt from the cached parent state or, when it was evicted, replayed
+    from the propagated root state.
+    With ``trail=True`` a single mutable ``store`` is kept instead: bound
+    changes are recorded on an undo log as they happen, and the caller brackets
+    each node with ``push_level``/``pop_level`` so backtracking only undoes the
+    changes made below the decision.
+
+    When trailing with a ``NoGoodStore``, every literal that becomes true is
+    pushed into the store, so learned nogoods prune (or force their last
+    literal false) during propagation. On a conflict the reasons recorded on
+    the trail form an implication graph, from which a first-UIP nogood is
+    derived and left in ``conflict_nogood``. In both modes the constraint
+    that failed, if any, is left in ``failed_constraint``.
+
+    A constraint found entailed after it ran is retired: it is no longer
+    woken up in the subtree of the node, as tracked by ``retired``, which
+    is restored by ``pop_level`` or kept with each cached state.
+
+    The copy-mode state cache is bounded by ``cache_max_entries`` and/or
+    ``cache_max_bytes`` (an estimate of the cached variables' footprint);
+    least recently used states are evicted first.
+    """
+
     def __init__(
         self,
         metrics: SolverMetrics,
         initial_variables: dict[str, SetVariable],
         constraints: list[Constraint],
         skip_propagation_func=None,
+        trail: bool = False,
+        nogoods=None,
+        cache_policy: CachePolicy = CachePolicy.LRU,
+        cache_max_entries: int | None = 10_000,
+        cache_max_bytes: int | None = None,
     ):
         self.metrics = metrics
         self.initial_state = initial_variables
         self.constraints = constraints
-        self._cache = {}
+        self.cache_policy = cache_policy
+        self.cache_max_entries = cache_max_entries
+        self.cache_max_bytes = cache_max_bytes
+        self._cache: OrderedDict[tuple, CacheEntry] = OrderedDict()
+        self._cache_bytes = 0
+        self._branch_keys: list[tuple] = []
+        # Propagated root state and its retired constraints, never evicted
+        self._root_state: dict[str, SetVariable] | None = None
+        self._root_retired: frozenset[Constraint] = frozenset()
         self._constraint_map = self._build_constraint_map()
+        # Entailed constraints of the current node, and the order in which
+        # they were retired (trail mode)
+        self.retired: set[Constraint] = set()
+        self._retired_trail: list[Constraint] = []
+        self._wake = self._build_wake_map()
+        self._priority_levels = 1 + max((c.priority for c in constraints), default=0)
         self.skip_propagation_func: Callable[[StateComputer], bool] = (
             skip_propagation_func or (lambda x: False)
         )
 
+        self.trail: list[tuple] | None = None
+        # (trail length, nogood store mark, retired count) at each push_level
+        self._levels: list[tuple[int, int, int]] = []
+        self.store: dict[str, SetVariable] = {}
+        # NoGoodStore fed with the literals of the trail (trail mode only)
+        self.nogoods = None
+        self.conflict_nogood: NoGood | None = None
+        # Constraint whose propagator raised the last conflict, if any
+        self.failed_constraint: Constraint | None = None
+        self._synced = 0
+        # Variables changed by undone trail entries, and the length of the
+        # trail already reported by ``changed_variables``
+        self._touched: set[str] = set()
+        self._touched_mark = 0
+        self._root_upper = {
+            name: var._upper_bound for name, var in initial_variables.items()
+        }
+        if trail:
+            self.trail = []
+            self.store = {name: var.copy() for name, var in initial_variables.items()}
+            for var in self.store.values():
+                var._trail = self.trail
+            if nogoods is not None:
+                self.nogoods = nogoods
+                nogoods.units = []
+
     def _build_constraint_map(self):
         constraint_map = {}
         for constraint in self.constraints:
@@ -118,49 +334,315 @@ class StateComputer:
                 constraint_map[var].append(constraint)
         return constraint_map
 
-    def compute_state_(
-        self, operations: tuple[Operation, ...]
-    ) -> dict[str, SetVariable]:
-        cache_key = tuple(
-            sorted(((op.variable, op.op_type, op.value, op.depth) for op in operations))
+    def _build_wake_map(self) -> dict[str, list[list[Constraint]]]:
+        """For each variable, the constraints to wake for each event combination."""
+        subscribed: dict[str, dict[Constraint, int]] = {}
+        for constraint in self.constraints:
+            for var, events in constraint.subscriptions():
+                per_var = subscribed.setdefault(var, {})
+                per_var[constraint] = per_var.get(constraint, 0) | events
+        return {
+            var: [
+                [c for c, mask in per_var.items() if mask & events]
+                for events in range(EVENT_ANY + 1)
+            ]
+            for var, per_var in subscribed.items()
+        }
+
+    def _wake_up(
+        self,
+        state: dict[str, SetVariable],
+        name: str,
+        propagation_queue: PropagationQueue,
+        skip: Constraint | None = None,
+    ) -> None:
+        """Queue the constraints subscribed to the pending events of ``name``.
+
+        A constraint is only checked for entailment when one of its variables
+        gets fixed: that is when most of them become entailed, and it happens
+        far less often than propagator calls.
+        """
+        var = state[name]
+        events = var._events
+        var._events = 0
+        if events & EVENT_FIXED:
+            for constraint in self._constraint_map.get(name, ()):
+                if constraint not in self.retired and constraint.is_entailed(state):
+                    self._retire(constraint)
+        if events and name in self._wake:
+            propagation_queue.extend(self._wake[name][events], skip)
+
+    @staticmethod
+    def _state_size(state: dict[str, SetVariable]) -> int:
+        return sys.getsizeof(state) + sum(
+            sys.getsizeof(var)
+            + sys.getsizeof(var._lower_bound)
+            + sys.getsizeof(var._upper_bound)
+            for var in state.values()
         )
 
-        if cache_key in self._cache:
-            self.metrics.cache_hits += 1
-            return self._cache[cache_key]
+    def _cache_get(self, key: tuple) -> dict[str, SetVariable] | None:
+        """Cached state for ``key``; its retired constraints become current."""
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        self._cache.move_to_end(key)
+        self.retired = set(entry.retired)
+        return entry.state
+
+    def _cache_evict(self, key: tuple) -> None:
+        entry = self._cache.pop(key, None)
+        if entry is not None:
+            self._cache_bytes -= entry.size
+            self.metrics.cache_evictions += 1
+
+    def _cache_put(self, key: tuple, state: dict[str, SetVariable]) -> None:
+        size = self._state_size(state) if self.cache_max_bytes is not None else 0
+        self._cache[key] = CacheEntry(state, size, frozenset(self.retired))
+        self._cache_bytes += size
+
+        if self.cache_policy == CachePolicy.BRANCH:
+            depth = len(key)
+            while len(self._branch_keys) > depth:
+                self._cache_evict(self._branch_keys.pop())
+            self._branch_keys.append(key)
+
+        while len(self._cache) > 1 and (
+            (
+                self.cache_max_entries is not None
+                and len(self._cache) > self.cache_max_entries
+            )
+            or (
+                self.cache_max_bytes is not None
+                and self._cache_bytes > self.cache_max_bytes
+            )
+        ):
+            self._cache_evict(next(iter(self._cache)))
 
-        current_state = {
-            name: SetVariable(name, var.lower_bound, var.upper_bound)
-            for name, var in self.initial_state.items()
-        }
+        self.metrics.cache_size = len(self._cache)
+        self.metrics.cache_bytes = self._cache_bytes
 
-        for op in operations:
-            var = current_state[op.variable]
-            if op.op_type == OperationType.ADD:
-                var._lower_bound.add(op.value)
-            else:
-                var._upper_bound.remove(op.value)
+    @staticmethod
+    def _apply(state: dict[str, SetVariable], op: Operation) -> None:
+        var = state[op.variable]
+        if op.op_type == OperationType.ADD:
+            var.include(1 << op.value)
+        else:
+            var.exclude(1 << op.value)
 
-        changed = True
-        while changed:
-            changed = False
-            for constraint in self.constraints:
-                if constraint.filter_domains(current_state):
-                    changed = True
+    def _queue(self, constraints=()) -> PropagationQueue:
+        return PropagationQueue(self._priority_levels, constraints, self.retired)
 
-        self._cache[cache_key] = current_state
-        return current_state
+    def _retire(self, constraint: Constraint) -> None:
+        self.retired.add(constraint)
+        if self.trail is not None:
+            self._retired_trail.append(constraint)
+        self.metrics.retired_constraints += 1
+
+    def active_constraints(self) -> list[Constraint]:
+        """Constraints of the last computed state that are not entailed yet."""
+        return [c for c in self.constraints if c not in self.retired]
 
-    def compute_state(
-        self, operations: tuple[Operation, ...]
+    def _propagate(
+        self, state: dict[str, SetVariable], propagation_queue: PropagationQueue
+    ):
+        learning = self.nogoods is not None
+        profiler = self.metrics.profiler
+        if learning:
+            self._sync_nogoods(state, propagation_queue)
+        while propagation_queue:
+            constraint = propagation_queue.pop()
+            try:
+                if profiler is None:
+                    changed_vars = constraint.filter_domains(state)
+                else:
+                    changed_vars = profiler.run(constraint, state)
+            except ValueError:
+                self.failed_constraint = constraint
+                raise
+            self.metrics.propagations += 1
+            if changed_vars:
+                # An idempotent propagator is already at its fixpoint
+                skip = constraint if constraint.idempotent else None
+                for var in changed_vars:
+                    self._wake_up(state, var, propagation_queue, skip)
+            if learning and self._synced < len(self.trail):
+                self._sync_nogoods(state, propagation_queue)
+
+    def _sync_nogoods(
+        self, state: dict[str, SetVariable], propagation_queue: PropagationQueue
+    ):
+        """Push the literals of the new trail entries into the nogood store.
+
+        Raises Conflict when a nogood is completed, and forces the last
+        literal of nogoods that became unit to be false.
+        """
+        trail = self.trail
+        nogoods = self.nogoods
+        while self._synced < len(trail):
+            while self._synced < len(trail):
+                position = self._synced
+                var, _, _, included, mask, _, _ = trail[position]
+                self._synced += 1
+                for value in iter_bitset(mask):
+                    violated = nogoods.push((var.name, included, value), position)
+                    if violated is not None:
+                        self.metrics.nogood_hits += 1
+                        raise Conflict(
+                            f"No-good violated: {violated}",
+                            tuple(
+                                (name, is_included, 1 << val)
+                                for name, is_included, val in violated.assignments
+                            ),
+                        )
+
+            for (name, included, value), others in nogoods.take_units():
+                reason = tuple((n, i, 1 << v) for n, i, v in others)
+                var = state[name]
+                if included:
+                    var.exclude(1 << value, reason)
+                else:
+                    var.include(1 << value, reason)
+                self._wake_up(state, name, propagation_queue)
+
+    def _analyze(self, reason: Reason) -> NoGood | None:
+        """Derive a first-UIP nogood from a conflict explanation.
+
+        Literals of the current decision level are replaced by the reasons
+        recorded on the trail, latest first, until a single one is left; root
+        level literals are dropped. Returns None when an unexplained change is
+        involved.
+        """
+        if reason is None or not self._levels:
+            return None
+        trail = self.trail
+        level_start = self._levels[-1][0]
+        root_end = self._levels[0][0]
+
+        # Literals of entries not yet pushed into the nogood store
+        unsynced = {}
+        for position in range(self._synced, len(trail)):
+            var, _, _, included, mask, _, _ = trail[position]
+            for value in iter_bitset(mask):
+                unsynced[(var.name, included, value)] = position
+
+        seen = set()
+        nogood = set()
+        current: list[tuple[int, tuple[str, bool, int]]] = []
+
+        def add(reason):
+            for name, included, mask in reason:
+                if not included:
+                    mask &= self._root_upper[name]
+                for value in iter_bitset(mask):
+                    literal = (name, included, value)
+                    if literal in seen:
+                        continue
+                    seen.add(literal)
+                    position = self.nogoods.position(literal)
+                    if position is None:
+                        position = unsynced.get(literal)
+                    if position is None or position < root_end:
+                        continue
+                    if position >= level_start:
+                        heapq.heappush(current, (-position, literal))
+                    else:
+                        nogood.add(literal)
+
+        add(reason)
+        while len(current) > 1:
+            position = -heapq.heappop(current)[0]
+            antecedents = trail[position][5]
+            if antecedents is None:
+                return None
+            add(antecedents)
+        if current:
+            nogood.add(current[0][1])
+        return NoGood(frozenset(nogood))
+
+    def push_level(self) -> None:
+        """Open a decision level on the trail."""
+        self._levels.append(
+            (
+                len(self.trail),
+                0 if self.nogoods is None else self.nogoods.mark(),
+                len(self._retired_trail),
+            )
+        )
+
+    def pop_level(self) -> None:
+        """Undo every bound change recorded since the matching ``push_level``."""
+        mark, nogood_mark, retired_mark = self._levels.pop()
+        trail = self.trail
+        while len(trail) > mark:
+            entry = trail.pop()
+            var = entry[0]
+            var._lower_bound = entry[1]
+            var._upper_bound = entry[2]
+            if entry[6] is not None:
+                var._card_min, var._card_max, var._card_reasons = entry[6]
+            var._events = 0
+            self._touched.add(var.name)
+        if self._synced > mark:
+            self._synced = mark
+        if self._touched_mark > mark:
+            self._touched_mark = mark
+        if self.nogoods is not None:
+            self.nogoods.pop_to(nogood_mark)
+        while len(self._retired_trail) > retired_mark:
+            self.retired.discard(self._retired_trail.pop())
+
+    def changed_variables(self) -> set[str]:
+        """Names of the store variables changed since the previous call.
+
+        Trail mode only; variables restored by ``pop_level`` are included.
+        """
+        changed = self._touched
+        trail = self.trail
+        for i in range(self._touched_mark, len(trail)):
+            changed.add(trail[i][0].name)
+        self._touched = set()
+        self._touched_mark = len(trail)
+        return changed
+
+    def _compute_state_trail(
+        self, operations: Sequence[Operation]
     ) -> dict[str, SetVariable]:
+        # The store already holds the propagated state of operations[:-1]
+        self.conflict_nogood = None
+        try:
+            if operations:
+                op = operations[-1]
+                self._apply(self.store, op)
+                propagation_queue = self._queue()
+                self._wake_up(self.store, op.variable, propagation_queue)
+            else:
+                propagation_queue = self._queue(self.constraints)
+
+            if not self.skip_propagation_func(self):
+                self._propagate(self.store, propagation_queue)
+            else:
+                self.metrics.skipped_propagations += 1
+        except Conflict as conflict:
+            if self.nogoods is not None:
+                self.conflict_nogood = self._analyze(conflict.reason)
+                self.nogoods.take_units()
+            raise
+        return self.store
+
+    def compute_state(self, operations: Sequence[Operation]) -> dict[str, SetVariable]:
+        self.failed_constraint = None
+        if self.trail is not None:
+            return self._compute_state_trail(operations)
+
         cache_key = tuple(
             sorted(((op.variable, op.op_type, op.value, op.depth) for op in operations))
         )
 
-        if cache_key in self._cache:
+        cached = self._cache_get(cache_key)
+        if cached is not None:
             self.metrics.cache_hits += 1
-            return self._cache[cache_key]
+            return cached
 
         if operations:
             prev_ops = operations[:-1]
@@ -169,60 +651,43 @@ class StateComputer:
                     ((op.variable, op.op_type, op.value, op.depth) for op in prev_ops)
                 )
             )
-            if prev_key in self._cache:
+            prev_state = self._cache_get(prev_key)
+            if prev_state is not None:
                 self.metrics.cache_hits += 1
-                current_state = {
-                    name: SetVariable(name, var.lower_bound, var.upper_bound)
-                    for name, var in self._cache[prev_key].items()
-                }
+                current_state = {name: var.copy() for name, var in prev_state.items()}
                 op = operations[-1]
-                var = current_state[op.variable]
-
-                if op.op_type == OperationType.ADD:
-                    # if op.value in var._lower_bound:
-                    var._lower_bound.add(op.value)
-                else:
-                    # if op.value in var._upper_bound:
-
-                    var._upper_bound.remove(op.value)
+                self._apply(current_state, op)
 
-                propagation_queue = deque()
-                if op.variable in self._constraint_map:
-                    propagation_queue.extend(self._constraint_map[op.variable])
+                propagation_queue = self._queue()
+                self._wake_up(current_state, op.variable, propagation_queue)
             else:
-                current_state = {
-                    name: SetVariable(name, var.lower_bound, var.upper_bound)
-                    for name, var in self.initial_state.items()
-                }
-                propagation_queue = deque()
+                self.metrics.cache_misses += 1
+                # Replay from the propagated root, so that no root pruning is lost
+                if self._root_state is None:
+                    self.retired = set()
+                    base = self.initial_state
+                    propagation_queue = self._queue(self.constraints)
+                else:
+                    self.retired = set(self._root_retired)
+                    base = self._root_state
+                    propagation_queue = self._queue()
+                current_state = {name: var.copy() for name, var in base.items()}
                 for op in operations:
-                    var = current_state[op.variable]
-                    if op.op_type == OperationType.ADD:
-                        var._lower_bound.add(op.value)
-                    else:
-                        var._upper_bound.remove(op.value)
-                    if op.variable in self._constraint_map:
-                        propagation_queue.extend(self._constraint_map[op.variable])
+                    self._apply(current_state, op)
+                    self._wake_up(current_state, op.variable, propagation_queue)
         else:
+            self.retired = set()
             current_state = {
-                name: SetVariable(name, var.lower_bound, var.upper_bound)
-                for name, var in self.initial_state.items()
+                name: var.copy() for name, var in self.initial_state.items()
             }
-            propagation_queue = deque()
-
-        processed = set()
+            propagation_queue = self._queue(self.constraints)
 
         if not self.skip_propagation_func(self):
-            while propagation_queue:
-                constraint = propagation_queue.popleft()
-                changed_vars = constraint.filter_domains(current_state)
-                if changed_vars:
-                    for var in changed_vars:
-                        if var in self._constraint_map:
-                            propagation_queue.extend(self._constraint_map[var])
-                processed.add(constraint)
-
-            self._cache[cache_key] = current_state
+            self._propagate(current_state, propagation_queue)
+            self._cache_put(cache_key, current_state)
+            if not operations:
+                self._root_state = current_state
+                self._root_retired = frozenset(self.retired)
         else:
             self.metrics.skipped_propagations += 1
         return current_state
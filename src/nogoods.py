@@ -0,0 +1,226 @@
+from src.misc import NoGood, Operation, OperationType, SolverMetrics
+
+Literal = tuple[str, bool, int]  # (variable, is_included, value)
+
+
+def operation_literal(op: Operation) -> Literal:
+    return (op.variable, op.op_type == OperationType.ADD, op.value)
+
+
+class _WatchedNoGood:
+    """A nogood whose first two literals are the watched ones."""
+
+    __slots__ = ("nogood", "literals", "activity", "hits")
+
+    def __init__(self, nogood: NoGood, literals: list[Literal], activity: float):
+        self.nogood = nogood
+        self.literals = literals
+        self.activity = activity
+        self.hits = 0
+
+
+class NoGoodStore:
+    """Learned nogoods indexed by two watched literals.
+
+    A nogood is violated once every one of its literals has been pushed as a
+    decision on the current path. Each nogood watches two literals that are
+    not both decided, so pushing a literal only examines the nogoods watching
+    it, as in the two-watched-literal scheme of SAT solvers. Watches are left
+    in place on ``pop``: undoing decisions can never break the invariant.
+
+    Literals may be implied ones as well as decisions. When ``units`` is a
+    list, nogoods left with a single undecided literal are collected there so
+    that the caller can force that literal false (see ``take_units``).
+
+    The database is bounded: nogoods longer than ``max_size`` are never
+    stored, and once more than ``budget`` are kept the store drops the least
+    active half, activity being bumped each time a nogood prunes and decayed
+    as new nogoods are learned. Nogoods of at most ``keep_size`` literals are
+    never deleted.
+    """
+
+    def __init__(
+        self,
+        metrics: SolverMetrics | None = None,
+        budget: int | None = 10_000,
+        max_size: int | None = None,
+        keep_size: int = 2,
+        activity_decay: float = 0.95,
+    ):
+        self.metrics = metrics
+        self.budget = budget
+        self.max_size = max_size
+        self.keep_size = keep_size
+        self.activity_decay = activity_decay
+        self._bump = 1.0
+        self._nogoods: dict[NoGood, _WatchedNoGood] = {}
+        self._watches: dict[Literal, list[_WatchedNoGood]] = {}
+        # Decided literals mapped to their position on the path
+        self._decided: dict[Literal, int] = {}
+        self._stack: list[Literal] = []
+        self.units: list[_WatchedNoGood] | None = None
+
+    def __len__(self) -> int:
+        return len(self._nogoods)
+
+    def __contains__(self, nogood: NoGood) -> bool:
+        return nogood in self._nogoods
+
+    def __iter__(self):
+        return iter(self._nogoods)
+
+    def add(self, nogood: NoGood) -> bool:
+        """Store ``nogood``; returns False if it was already known or rejected."""
+        if nogood in self._nogoods or not nogood.assignments:
+            return False
+        if self.max_size is not None and len(nogood.assignments) > self.max_size:
+            if self.metrics is not None:
+                self.metrics.nogoods_rejected += 1
+            return False
+
+        # Watch undecided literals first, then the most recently decided ones,
+        # which are the first to be undone when the search backtracks
+        decided = self._decided
+        literals = sorted(
+            nogood.assignments,
+            key=lambda lit: (lit in decided, -decided.get(lit, 0)),
+        )
+        entry = _WatchedNoGood(nogood, literals, self._bump)
+        self._nogoods[nogood] = entry
+        for lit in literals[:2]:
+            self._watches.setdefault(lit, []).append(entry)
+
+        self._bump /= self.activity_decay
+        if self._bump > 1e100:
+            for other in self._nogoods.values():
+                other.activity *= 1e-100
+            self._bump *= 1e-100
+
+        if self.budget is not None and len(self._nogoods) > self.budget:
+            self.reduce()
+        if self.metrics is not None:
+            self.metrics.nogoods_kept = len(self._nogoods)
+        return True
+
+    def discard(self, nogood: NoGood) -> None:
+        entry = self._nogoods.pop(nogood, None)
+        if entry is None:
+            return
+        for lit in entry.literals[:2]:
+            self._watches[lit].remove(entry)
+
+    def reduce(self) -> int:
+        """Drop the least active half of the deletable nogoods.
+
+        Returns the number of nogoods deleted.
+        """
+        candidates = [
+            entry
+            for entry in self._nogoods.values()
+            if len(entry.literals) > self.keep_size
+        ]
+        candidates.sort(key=lambda entry: (entry.activity, -len(entry.literals)))
+        doomed = candidates[: len(candidates) // 2]
+        if not doomed:
+            return 0
+
+        for entry in doomed:
+            del self._nogoods[entry.nogood]
+        doomed_ids = {id(entry) for entry in doomed}
+        for lit, watchers in self._watches.items():
+            self._watches[lit] = [e for e in watchers if id(e) not in doomed_ids]
+
+        if self.metrics is not None:
+            self.metrics.nogoods_deleted += len(doomed)
+            self.metrics.nogood_reductions += 1
+            self.metrics.nogoods_kept = len(self._nogoods)
+        return len(doomed)
+
+    def _hit(self, entry: _WatchedNoGood) -> None:
+        entry.hits += 1
+        entry.activity += self._bump
+
+    def hits(self, nogood: NoGood) -> int:
+        entry = self._nogoods.get(nogood)
+        return 0 if entry is None else entry.hits
+
+    def position(self, literal: Literal) -> int | None:
+        return self._decided.get(literal)
+
+    def push(self, literal: Literal, position: int | None = None) -> NoGood | None:
+        """Decide ``literal``; returns a nogood it completes, if any.
+
+        ``position`` orders the literals along the path and defaults to the
+        number of decided literals. A completed nogood means the path is dead:
+        the caller must ``pop`` the literal before pushing anything else.
+        """
+        decided = self._decided
+        decided[literal] = len(decided) if position is None else position
+        self._stack.append(literal)
+
+        watchers = self._watches.get(literal)
+        if not watchers:
+            return None
+
+        violated = None
+        keep = []
+        for i, entry in enumerate(watchers):
+            lits = entry.literals
+            if len(lits) == 1:
+                keep.append(entry)
+                violated = entry.nogood
+                self._hit(entry)
+            else:
+                if lits[0] == literal:
+                    lits[0], lits[1] = lits[1], lits[0]
+                for k in range(2, len(lits)):
+                    if lits[k] not in decided:
+                        lits[1], lits[k] = lits[k], lits[1]
+                        self._watches.setdefault(lits[1], []).append(entry)
+                        break
+                else:
+                    keep.append(entry)
+                    if lits[0] in decided:
+                        violated = entry.nogood
+                        self._hit(entry)
+                    elif self.units is not None:
+                        self.units.append(entry)
+            if violated is not None:
+                keep.extend(watchers[i + 1 :])
+                break
+
+        self._watches[literal] = keep
+        return violated
+
+    def pop(self, literal: Literal) -> None:
+        """Undo the most recent ``push``, which decided ``literal``."""
+        del self._decided[self._stack.pop()]
+
+    def mark(self) -> int:
+        return len(self._stack)
+
+    def pop_to(self, mark: int) -> None:
+        """Undo every ``push`` made since ``mark`` was taken."""
+        stack = self._stack
+        decided = self._decided
+        while len(stack) > mark:
+            del decided[stack.pop()]
+
+    def take_units(self) -> list[tuple[Literal, list[Literal]]]:
+        """Drain the unit nogoods collected since the last call.
+
+        Returns (literal, others) pairs where every literal of ``others`` is
+        decided, so ``literal`` must be made false.
+        """
+        if not self.units:
+            return []
+        decided = self._decided
+        units = []
+        for entry in self.units:
+            literal = entry.literals[0]
+            others = entry.literals[1:]
+            if literal not in decided and all(lit in decided for lit in others):
+                units.append((literal, others))
+                self._hit(entry)
+        self.units.clear()
+        return units
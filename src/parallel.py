@@ -0,0 +1,359 @@
+import itertools
+import math
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Sequence
+
+from src.constraints import Constraint
+from src.misc import Operation, OperationType, SolverMetrics, StateComputer
+from src.restarts import RestartPolicy, RestartSchedule
+from src.solver import (
+    SearchHook,
+    SearchInterrupted,
+    SetSolver,
+    VariableStrategy,
+    VariableValueStrategy,
+)
+from src.variables import SetVariable
+
+# Set by the parent process to stop every worker of the pool, and (parallel
+# search) to ask workers for more subproblems when some of them are idle
+_stop_event = None
+_hungry_event = None
+# The variables and constraints to solve, and (parallel search) the solver
+# configuration and min_nodes of every subproblem; sent once to each worker
+# instead of with every task
+_model: tuple[list[SetVariable], list[Constraint]] | None = None
+_subproblem_options: tuple[dict, int] | None = None
+
+
+def _init_worker(
+    stop_event, hungry_event=None, model=None, subproblem_options=None
+) -> None:
+    global _stop_event, _hungry_event, _model, _subproblem_options
+    _stop_event = stop_event
+    _hungry_event = hungry_event
+    _model = model
+    _subproblem_options = subproblem_options
+    # Ctrl-C is handled by the parent, which then stops the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class StopHook(SearchHook):
+    """Interrupts the search once ``event`` is set, polled every ``every`` nodes."""
+
+    def __init__(self, event, every: int = 64):
+        self.event = event
+        self.every = every
+        self._nodes = 0
+
+    def on_node(self, solver, path, state) -> None:
+        self._nodes += 1
+        if self._nodes % self.every == 0 and self.event.is_set():
+            raise SearchInterrupted()
+
+    def on_conflict(self, solver, path) -> None:
+        self.on_node(solver, path, None)
+
+
+def _build_solver(configuration: dict) -> SetSolver:
+    variables, constraints = _model
+    solver = SetSolver(**configuration)
+    for var in variables:
+        solver.add_variable(var.copy())
+    for constraint in constraints:
+        solver.add_constraint(constraint)
+    if _stop_event is not None:
+        solver.add_hook(StopHook(_stop_event))
+    return solver
+
+
+def _solve_configuration(
+    index: int, configuration: dict
+) -> tuple[int, dict[str, set] | None, bool, dict]:
+    solver = _build_solver(configuration)
+    solution = solver.solve()
+    return index, solution, solver.interrupted, solver.metrics.as_dict()
+
+
+@dataclass
+class PortfolioResult:
+    solution: dict[str, set[int]] | None
+    # Index and configuration of the solver that answered first, if any
+    winner: int | None
+    configuration: dict | None
+    metrics: dict | None  # the winner's SolverMetrics.as_dict()
+    elapsed: float
+
+
+def portfolio_configurations(n: int, seed: int = 0) -> list[dict]:
+    """``n`` diverse ``SetSolver`` configurations, with distinct seeds."""
+    variable_strategies = [
+        VariableStrategy.SMALLEST_DOMAIN,
+        VariableStrategy.DOM_WDEG,
+        VariableStrategy.FIRST,
+        VariableStrategy.IMPACT,
+    ]
+    value_strategies = [VariableValueStrategy.RANDOM, VariableValueStrategy.SIMPLE]
+    restart_policies = [
+        RestartPolicy(RestartSchedule.LUBY),
+        RestartPolicy(RestartSchedule.GEOMETRIC),
+    ]
+    combinations = itertools.cycle(
+        itertools.product(restart_policies, value_strategies, variable_strategies)
+    )
+    return [
+        {
+            "variable_strategy": variable_strategy,
+            "value_strategy": value_strategy,
+            "restart_policy": restart_policy,
+            "seed": seed + i,
+        }
+        for i, (restart_policy, value_strategy, variable_strategy) in zip(
+            range(n), combinations
+        )
+    ]
+
+
+def solve_portfolio(
+    solver: SetSolver,
+    configurations: Sequence[dict],
+    workers: int | None = None,
+    timeout: float | None = None,
+) -> PortfolioResult:
+    """Race differently configured solvers on the model of ``solver``.
+
+    Each configuration holds ``SetSolver`` keyword arguments, typically
+    including a ``seed``; it is solved in its own process on a copy of
+    the variables and constraints of ``solver``. The first solver to finish
+    (with a solution, or a proof that there is none) wins and the others
+    are stopped. Without a winner before ``timeout`` seconds, the result
+    has neither a solution nor a winner.
+    """
+    start = time.time()
+    model = (list(solver.variables.values()), solver.constraints)
+    workers = workers or min(len(configurations), os.cpu_count() or 1)
+    stop_event = multiprocessing.Event()
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(stop_event, None, model),
+    )
+    result = PortfolioResult(None, None, None, None, 0.0)
+    try:
+        pending = {
+            executor.submit(_solve_configuration, index, configuration)
+            for index, configuration in enumerate(configurations)
+        }
+        deadline = None if timeout is None else start + timeout
+        while pending and result.winner is None:
+            remaining = None if deadline is None else max(0.0, deadline - time.time())
+            done, pending = wait(
+                pending, timeout=remaining, return_when=FIRST_COMPLETED
+            )
+            if not done:
+                break
+            for future in done:
+                index, solution, interrupted, metrics = future.result()
+                if not interrupted:
+                    result = PortfolioResult(
+                        solution, index, configurations[index], metrics, 0.0
+                    )
+                    break
+    finally:
+        stop_event.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+    result.elapsed = time.time() - start
+    return result
+
+
+def split_subproblems(
+    solver: SetSolver,
+    depth: int | None = None,
+    count: float = 1,
+    prefix: Sequence[Operation] = (),
+) -> list[tuple[Operation, ...]]:
+    """Split the search space below ``prefix`` into disjoint subproblems.
+
+    Each level branches every subproblem on a value of its smallest
+    undecided variable, once with the value added and once removed, so
+    the subproblems partition the space. Splitting stops after ``depth``
+    levels or once there are ``count`` subproblems; those that fail
+    propagation on the way are dropped.
+    """
+    computer = StateComputer(SolverMetrics(), solver.variables, solver.constraints)
+    frontier = [tuple(prefix)]
+    level = 0
+    while len(frontier) < count and (depth is None or level < depth):
+        split = False
+        children = []
+        for operations in frontier:
+            try:
+                state = computer.compute_state(operations)
+            except ValueError:
+                continue
+            var = min(
+                (var for var in state.values() if not var.is_determined()),
+                key=SetVariable.domain_size,
+                default=None,
+            )
+            if var is None:
+                children.append(operations)
+                continue
+            value = (var.undetermined & -var.undetermined).bit_length() - 1
+            for op_type in (OperationType.ADD, OperationType.REMOVE):
+                op = Operation(var.name, op_type, value, len(operations))
+                children.append(operations + (op,))
+            split = True
+        frontier = children
+        level += 1
+        if not split:
+            break
+    return frontier
+
+
+class _YieldHook(SearchHook):
+    """Gives the subproblem back to be re-split while other workers are idle."""
+
+    def __init__(self, event, min_nodes: int, every: int = 64):
+        self.event = event
+        self.min_nodes = min_nodes
+        self.every = every
+        self._nodes = 0
+        self.yielded = False
+
+    def on_node(self, solver, path, state) -> None:
+        self._nodes += 1
+        if (
+            self._nodes % self.every == 0
+            and self._nodes >= self.min_nodes
+            and self.event.is_set()
+        ):
+            self.yielded = True
+            raise SearchInterrupted()
+
+
+def _solve_subproblem(
+    prefix: tuple[Operation, ...],
+) -> tuple[str, dict[str, set] | None, int]:
+    configuration, min_nodes = _subproblem_options
+    solver = _build_solver(configuration)
+    hook = _YieldHook(_hungry_event, min_nodes)
+    if _hungry_event is not None:
+        solver.add_hook(hook)
+    try:
+        for op in prefix:
+            var = solver.variables[op.variable]
+            if op.op_type == OperationType.ADD:
+                var.include(1 << op.value)
+            else:
+                var.exclude(1 << op.value)
+    except ValueError:
+        return "infeasible", None, 0
+    solution = solver.solve()
+    if solver.interrupted:
+        status = "yielded" if hook.yielded else "stopped"
+    else:
+        status = "infeasible" if solution is None else "solution"
+    return status, solution, solver.metrics.branches
+
+
+@dataclass
+class ParallelSearchResult:
+    solution: dict[str, set[int]] | None
+    # One solution per satisfiable subproblem in exhaustive mode
+    solutions: list[dict[str, set[int]]]
+    # Whether the answer is definitive: a solution was found in first-solution
+    # mode, or every subproblem was settled
+    complete: bool
+    subproblems: int  # settled subproblems
+    resplits: int
+    nodes: int  # search nodes summed over the workers
+    elapsed: float
+
+
+def solve_parallel(
+    solver: SetSolver,
+    configuration: dict | None = None,
+    workers: int | None = None,
+    depth: int | None = None,
+    subproblems_per_worker: int = 30,
+    first_solution: bool = True,
+    min_nodes: int = 1000,
+    resplit_depth: int | None = None,
+    timeout: float | None = None,
+) -> ParallelSearchResult:
+    """Split the search on the model of ``solver`` across a process pool.
+
+    The root is decomposed by fixing the first ``depth`` decisions, or
+    enough of them to get ``subproblems_per_worker`` subproblems per worker,
+    and the subproblems are queued on the pool, each solved by a SetSolver
+    built from ``configuration``. While workers are idle, a worker that has
+    spent ``min_nodes`` nodes on its subproblem gives it back, and it is
+    re-split ``resplit_depth`` levels deeper and queued again.
+
+    In first-solution mode the search stops at the first solution;
+    otherwise every subproblem is settled, which proves infeasibility when
+    no solution is found.
+    """
+    start = time.time()
+    configuration = configuration or {}
+    workers = workers or os.cpu_count() or 1
+    resplit_depth = resplit_depth or max(1, workers.bit_length())
+    model = (list(solver.variables.values()), solver.constraints)
+    stop_event = multiprocessing.Event()
+    hungry_event = multiprocessing.Event()
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(stop_event, hungry_event, model, (configuration, min_nodes)),
+    )
+    result = ParallelSearchResult(None, [], False, 0, 0, 0, 0.0)
+
+    def submit(prefix):
+        return executor.submit(_solve_subproblem, prefix)
+
+    try:
+        count = math.inf if depth is not None else subproblems_per_worker * workers
+        pending = {
+            submit(prefix): prefix
+            for prefix in split_subproblems(solver, depth=depth, count=count)
+        }
+        deadline = None if timeout is None else start + timeout
+        while pending:
+            if len(pending) < workers:
+                hungry_event.set()
+            else:
+                hungry_event.clear()
+            remaining = None if deadline is None else max(0.0, deadline - time.time())
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                prefix = pending.pop(future)
+                status, solution, nodes = future.result()
+                result.nodes += nodes
+                if status == "yielded":
+                    result.resplits += 1
+                    for child in split_subproblems(
+                        solver, depth=resplit_depth, count=math.inf, prefix=prefix
+                    ):
+                        pending[submit(child)] = child
+                elif status != "stopped":
+                    result.subproblems += 1
+                    if solution is not None:
+                        result.solutions.append(solution)
+            if first_solution and result.solutions:
+                break
+        result.complete = not pending or (first_solution and bool(result.solutions))
+    finally:
+        stop_event.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+    if result.solutions:
+        result.solution = result.solutions[0]
+    result.elapsed = time.time() - start
+    return result
@@ -0,0 +1,87 @@
+import json
+import time
+
+from src.variables import SetVariable
+
+
+class PropagatorStats:
+    __slots__ = ("calls", "time", "pruning_calls", "values_removed", "conflicts")
+
+    def __init__(self):
+        self.calls = 0
+        self.time = 0.0
+        self.pruning_calls = 0
+        self.values_removed = 0
+        self.conflicts = 0
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class PropagationProfiler:
+    """Counts, times and measures the pruning of ``filter_domains`` calls.
+
+    Statistics are grouped by constraint class, or by constraint instance
+    when ``per_instance`` is set. Values removed are undecided values that
+    became decided during the call, cardinality settling included.
+    """
+
+    def __init__(self, per_instance: bool = False):
+        self.per_instance = per_instance
+        self.stats: dict[str, PropagatorStats] = {}
+        self._keys: dict[object, tuple[str, list[str]]] = {}
+
+    def _key(self, constraint) -> tuple[str, list[str]]:
+        entry = self._keys.get(constraint)
+        if entry is None:
+            key = type(constraint).__name__
+            if self.per_instance:
+                key = f"{key} {constraint}"
+            entry = self._keys[constraint] = (key, constraint.get_variables())
+        return entry
+
+    def run(self, constraint, variables: dict[str, SetVariable]) -> set[str]:
+        """Call ``constraint.filter_domains(variables)`` and record it."""
+        key, names = self._key(constraint)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = PropagatorStats()
+        before = sum(variables[name].domain_size() for name in names)
+        start = time.perf_counter()
+        try:
+            changed = constraint.filter_domains(variables)
+        except ValueError:
+            stats.conflicts += 1
+            raise
+        finally:
+            stats.time += time.perf_counter() - start
+            stats.calls += 1
+        if changed:
+            stats.pruning_calls += 1
+            stats.values_removed += before - sum(
+                variables[name].domain_size() for name in names
+            )
+        return changed
+
+    def as_dict(self) -> dict[str, dict]:
+        return {key: stats.as_dict() for key, stats in self.stats.items()}
+
+    def to_json(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+    def table(self) -> str:
+        """The statistics as a text table, most expensive propagators first."""
+        rows = sorted(self.stats.items(), key=lambda item: -item[1].time)
+        width = max([len("Propagator")] + [len(key) for key, _ in rows])
+        lines = [
+            f"{'Propagator':<{width}} {'calls':>9} {'pruned':>9} {'removed':>9} "
+            f"{'fails':>7} {'time (s)':>9} {'us/call':>8}"
+        ]
+        for key, stats in rows:
+            lines.append(
+                f"{key:<{width}} {stats.calls:>9} {stats.pruning_calls:>9} "
+                f"{stats.values_removed:>9} {stats.conflicts:>7} "
+                f"{stats.time:>9.3f} {1e6 * stats.time / max(1, stats.calls):>8.1f}"
+            )
+        return "\n".join(lines)
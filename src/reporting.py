@@ -0,0 +1,92 @@
+import json
+import sys
+import time
+from typing import TextIO
+
+from src.misc import SolverMetrics
+
+
+class Reporter:
+    """Receives progress and the final statistics of a search; silent.
+
+    ``tick`` is called at every node and forwards to ``progress`` at most
+    once every ``interval`` seconds, so reporting costs a clock read per node.
+    """
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self._next_report = 0.0
+
+    def tick(self, metrics: SolverMetrics) -> None:
+        now = time.monotonic()
+        if now >= self._next_report:
+            self._next_report = now + self.interval
+            self.progress(metrics)
+
+    def progress(self, metrics: SolverMetrics) -> None:
+        pass
+
+    def summary(self, metrics: SolverMetrics, interrupted: bool = False) -> None:
+        pass
+
+
+class SilentReporter(Reporter):
+    def tick(self, metrics: SolverMetrics) -> None:
+        pass
+
+
+class TextReporter(Reporter):
+    """Human-readable status lines and the ``pretty_print`` statistics."""
+
+    def __init__(self, interval: float = 1.0, stream: TextIO | None = None):
+        super().__init__(interval)
+        self.stream = stream
+
+    def progress(self, metrics: SolverMetrics) -> None:
+        print(
+            f"Branches: {metrics.branches:,d} | "
+            f"Max Depth: {metrics.max_depth} | "
+            f"Current Depth: {metrics.current_depth} | "
+            f"Max Depth Hits: {int(metrics.max_depth_hits)}",
+            file=self.stream or sys.stdout,
+        )
+
+    def summary(self, metrics: SolverMetrics, interrupted: bool = False) -> None:
+        metrics.pretty_print(interrupted=interrupted, file=self.stream)
+
+
+class JsonLinesReporter(Reporter):
+    """One JSON object per line: ``progress`` records, then a ``summary``."""
+
+    def __init__(self, interval: float = 1.0, stream: TextIO | None = None):
+        super().__init__(interval)
+        self.stream = stream
+
+    def _emit(self, record: dict) -> None:
+        stream = self.stream or sys.stdout
+        stream.write(json.dumps(record) + "\n")
+        stream.flush()
+
+    def progress(self, metrics: SolverMetrics) -> None:
+        self._emit(
+            {
+                "event": "progress",
+                "elapsed": time.time() - metrics.start_time,
+                "branches": metrics.branches,
+                "max_depth": metrics.max_depth,
+                "current_depth": metrics.current_depth,
+                "propagations": metrics.propagations,
+                "nogoods_learned": metrics.nogoods_learned,
+                "restarts": metrics.restart_count,
+            }
+        )
+
+    def summary(self, metrics: SolverMetrics, interrupted: bool = False) -> None:
+        self._emit(
+            {
+                "event": "summary",
+                "interrupted": interrupted,
+                "solved": bool(metrics.solution),
+                **metrics.as_dict(),
+            }
+        )
@@ -0,0 +1,66 @@
+from enum import Enum
+
+from src.misc import SolverMetrics
+
+
+class RestartSchedule(Enum):
+    LUBY = "luby"  # scale * 1, 1, 2, 1, 1, 2, 4, ... failures
+    GEOMETRIC = "geometric"  # scale * factor ** run failures
+    FIXED = "fixed"  # scale failures per run
+    DEPTH_HITS = "depth_hits"  # once the deepest level keeps failing
+    NEVER = "never"
+
+
+def luby(i: int) -> int:
+    """Term ``i`` (from 0) of the Luby sequence 1, 1, 2, 1, 1, 2, 4, 1, ..."""
+    size, seq = 1, 0
+    while size < i + 1:
+        seq += 1
+        size = 2 * size + 1
+    while size - 1 != i:
+        size = (size - 1) >> 1
+        seq -= 1
+        i %= size
+    return 1 << seq
+
+
+class RestartPolicy:
+    """Decides when the search abandons its current run and starts over.
+
+    Failure-based schedules restart once a run has failed ``cutoff(run)``
+    times; as the cut-off grows without bound, some run eventually
+    completes. ``DEPTH_HITS`` is the original heuristic, restarting when
+    the deepest levels reached keep failing.
+    """
+
+    def __init__(
+        self,
+        schedule: RestartSchedule = RestartSchedule.LUBY,
+        scale: int = 100,
+        factor: float = 1.5,
+    ):
+        if scale < 1:
+            raise ValueError("scale must be at least 1")
+        if factor <= 1:
+            raise ValueError("factor must be greater than 1")
+        self.schedule = schedule
+        self.scale = scale
+        self.factor = factor
+
+    def __repr__(self) -> str:
+        return f"RestartPolicy({self.schedule.name}, scale={self.scale}, factor={self.factor})"
+
+    def cutoff(self, run: int) -> int:
+        """Failures allowed in run ``run`` (from 0); 0 means unlimited."""
+        if self.schedule == RestartSchedule.LUBY:
+            return self.scale * luby(run)
+        if self.schedule == RestartSchedule.GEOMETRIC:
+            return int(self.scale * self.factor**run)
+        if self.schedule == RestartSchedule.FIXED:
+            return self.scale
+        return 0
+
+    def should_restart(self, metrics: SolverMetrics) -> bool:
+        if self.schedule == RestartSchedule.DEPTH_HITS:
+            return metrics.max_depth_hits >= 10 + metrics.max_depth
+        return 0 < metrics.restart_cutoff <= metrics.run_failures
@@ -1,16 +1,33 @@
 import time
-import signal
-import sys
 import random
 from enum import Enum
+from typing import Callable, Iterator
 
 from src.constraints import Constraint
-from src.misc import NoGood, Operation, OperationType, SolverMetrics, StateComputer
-from src.variables import SetVariable
+from src.heuristics import VariableHeap
+from src.misc import (
+    CachePolicy,
+    MetricTier,
+    NoGood,
+    Operation,
+    OperationType,
+    SolverMetrics,
+    StateComputer,
+)
+from src.nogoods import NoGoodStore, operation_literal
+from src.reporting import Reporter, SilentReporter
+from src.restarts import RestartPolicy
+from src.trace import DecisionTrace
+from src.variables import SetVariable, iter_bitset
+from src.visited import BloomVisitedStates, VisitedStates, extend_fingerprint
 from .visualization import SetTreeVisualizer, ConstraintGraphVisualizer
 
+# Interned decisions kept at most; the table starts over when it is full
+_MAX_INTERNED_OPERATIONS = 1 << 16
 
-class Restarting(Exception): ...
+
+class SearchInterrupted(Exception):
+    """Raised, e.g. by a hook, to stop the search; ``solve`` returns None."""
 
 
 class VariableStrategy(Enum):
@@ -20,12 +37,16 @@ class VariableStrategy(Enum):
     MOST_CONSTRAINED = "most_constrained"
     RANDOM = "random"
     CUSTOM_ORDER = "custom_order"
+    WDEG = "wdeg"  # largest weighted degree
+    DOM_WDEG = "dom_wdeg"  # smallest domain size over weighted degree
+    IMPACT = "impact"  # largest total impact of the undecided values
 
 
 class VariableValueStrategy(Enum):
     SIMPLE = "simple"
     RANDOM = "random"
     LOWEST_FREQUENCY = "lowest_frequency"
+    IMPACT = "impact"  # lowest impact first
 
 
 class RestartingStrategy(Enum):
@@ -34,204 +55,360 @@ class RestartingStrategy(Enum):
     CONSTRAINED_RANDOM = "constrained_random"
 
 
+class BacktrackingStrategy(Enum):
+    COPY = "copy"
+    TRAIL = "trail"
+
+
+class SearchHook:
+    """Callbacks from the search engine; override the events of interest.
+
+    ``path`` is the solver's live decision stack: copy it to keep it.
+    """
+
+    def on_node(self, solver, path: list[Operation], state) -> None:
+        """A node's state was propagated without conflict."""
+
+    def on_conflict(self, solver, path: list[Operation]) -> None:
+        """Propagating the node reached by ``path`` failed."""
+
+    def on_decision(self, solver, path: list[Operation], op: Operation) -> None:
+        """``op`` was pushed, opening the child node ``path``."""
+
+    def on_backtrack(self, solver, path: list[Operation], op: Operation) -> None:
+        """``op`` was undone; ``path`` is back to its parent node."""
+
+    def on_solution(self, solver, path: list[Operation], solution) -> None:
+        pass
+
+    def on_restart(self, solver) -> None:
+        pass
+
+
 class SetSolver:
     def __init__(
         self,
         variable_strategy: VariableStrategy = VariableStrategy.SMALLEST_DOMAIN,
         value_strategy: VariableValueStrategy = VariableValueStrategy.RANDOM,
         restarting_strategy: RestartingStrategy = RestartingStrategy.CONSTRAINED_RANDOM,
+        backtracking_strategy: BacktrackingStrategy = BacktrackingStrategy.TRAIL,
+        restart_policy: RestartPolicy | None = None,
+        cache_policy: CachePolicy = CachePolicy.LRU,
+        cache_max_entries: int | None = 10_000,
+        cache_max_bytes: int | None = None,
+        fingerprint_bits: int = 64,
+        visited_false_positive_rate: float | None = None,
+        visited_capacity: int = 1_000_000,
+        nogood_budget: int | None = 10_000,
+        max_nogood_size: int | None = None,
         custom_order: list[str] | None = None,
         visualize: bool = False,
+        reporter: Reporter | None = None,
+        metric_tiers: MetricTier = MetricTier.NONE,
+        seed: int | None = None,
+        record_trace: bool = False,
+        replay: DecisionTrace | None = None,
     ) -> None:
-        self.nogoods: set[NoGood] = set()
         self.variable_strategy = variable_strategy
         self.value_strategy = value_strategy
         self.restarting_strategy = restarting_strategy
+        self.backtracking_strategy = backtracking_strategy
+        self.restart_policy = restart_policy or RestartPolicy()
+        self.cache_policy = cache_policy
+        self.cache_max_entries = cache_max_entries
+        self.cache_max_bytes = cache_max_bytes
         self.custom_order = custom_order or []
         self.visualize = visualize
+        # Every random choice of the search is drawn from this generator
+        self.seed = seed
+        self.random = random.Random(seed)
+        # Branching choices and restarts, recorded when ``record_trace`` is
+        # set; with ``replay`` the search follows them instead of choosing
+        self.trace: DecisionTrace | None = None
+        self.record_trace = record_trace
+        self.replay = replay
+        self._replay_events: Iterator[tuple] | None = None
+        self._replay_next: tuple | None = None
 
         self.variables: dict[str, SetVariable] = {}
         self.constraints: list[Constraint] = []
-        self.metrics = SolverMetrics()
+        self.metrics = SolverMetrics(metric_tiers)
+        self.reporter: Reporter = reporter or SilentReporter()
+        self._count_frequencies = (
+            MetricTier.FREQUENCIES in metric_tiers
+            or value_strategy == VariableValueStrategy.LOWEST_FREQUENCY
+        )
+        self._measure_impact = replay is None and (
+            variable_strategy == VariableStrategy.IMPACT
+            or value_strategy == VariableValueStrategy.IMPACT
+        )
+        # Search space (undecided values) of the nodes on the current path
+        self._spaces: list[int] = []
+        self.nogoods = NoGoodStore(
+            self.metrics, budget=nogood_budget, max_size=max_nogood_size
+        )
         self.visualizer: SetTreeVisualizer | None = (
             SetTreeVisualizer() if visualize else None
         )
         self.operation_history: list[Operation] = []
+        # Decisions from the root to the current node, reused by the search
+        self.decisions: list[Operation] = []
+        self._operations: dict[tuple, Operation] = {}
+        self.hooks: list[SearchHook] = []
         self.solution_path: list[Operation] = []
-        self.visited_states: set[tuple[Operation, ...]] = set()
+        if fingerprint_bits not in (64, 128):
+            raise ValueError("fingerprint_bits must be 64 or 128")
+        self.fingerprint_bits = fingerprint_bits
+        # Paths are remembered by fixed-size fingerprints; a false-positive
+        # rate switches to an approximate, constant-memory Bloom filter
+        self.visited_states: VisitedStates | BloomVisitedStates = (
+            VisitedStates()
+            if visited_false_positive_rate is None
+            else BloomVisitedStates(visited_capacity, visited_false_positive_rate)
+        )
         self.state_computer: StateComputer
+        self._rank: Callable[[SetVariable], tuple] | None = None
+        # Failure counts of the constraints, starting at 1, and their sum
+        # over the constraints of each variable; kept across restarts
+        self.constraint_weights: dict[Constraint, int] = {}
+        self._weighted_degrees: dict[str, int] = {}
+        # Number of constraints on each variable, kept up by add_constraint
+        self._degrees: dict[str, int] = {}
+        self._variable_heap: VariableHeap | None = None
         self.restarting = False
-
-        signal.signal(signal.SIGINT, self.handle_interrupt)
+        # Whether the last solve() was stopped before completing
+        self.interrupted = False
 
     def add_variable(self, variable: SetVariable) -> None:
         self.variables[variable.name] = variable
-        for value in variable._upper_bound:
+        if not self._count_frequencies:
+            return
+        for value in iter_bitset(variable._upper_bound):
             if variable.name not in self.metrics.var_value_frequency:
                 self.metrics.var_value_frequency[variable.name] = {}
             self.metrics.var_value_frequency[variable.name][value] = 0
 
     def add_constraint(self, constraint: Constraint) -> None:
         self.constraints.append(constraint)
+        for name in constraint.get_variables():
+            self._degrees[name] = self._degrees.get(name, 0) + 1
+
+    def add_hook(self, hook: "SearchHook") -> None:
+        self.hooks.append(hook)
 
     def get_variable_constraints(self, var_name: str) -> int:
-        return sum(
-            1
-            for c in self.constraints
-            if var_name
-            in [
-                getattr(c, attr) for attr in dir(c) if isinstance(getattr(c, attr), str)
-            ]
-        )
+        """Number of constraints on ``var_name``, from the solver's index."""
+        return self._degrees.get(var_name, 0)
 
     def visualize_constraint_graph(self):
         constraint_viz = ConstraintGraphVisualizer()
         constraint_viz.build_graph(self.variables, self.constraints)
         constraint_viz.save(f"constraint_graph_{time.strftime('%Y%m%d_%H%M%S')}")
 
+    def _ranking(self) -> Callable[[SetVariable], tuple] | None:
+        """Sort key of the variable strategy, best variable first.
+
+        Keys end with the variable's position so that ties are broken in
+        declaration order; None for the RANDOM strategy.
+        """
+        index = {name: i for i, name in enumerate(self.variables)}
+        strategy = self.variable_strategy
+        if strategy == VariableStrategy.RANDOM:
+            return None
+        if strategy == VariableStrategy.SMALLEST_DOMAIN:
+            return lambda var: (var.domain_size(), index[var.name])
+        if strategy in (
+            VariableStrategy.LEAST_CONSTRAINED,
+            VariableStrategy.MOST_CONSTRAINED,
+        ):
+            sign = 1 if strategy == VariableStrategy.LEAST_CONSTRAINED else -1
+            degrees = {
+                name: sign * self.get_variable_constraints(name)
+                for name in self.variables
+            }
+            return lambda var: (degrees[var.name], index[var.name])
+        if strategy == VariableStrategy.WDEG:
+            wdeg = self._weighted_degrees
+            return lambda var: (-wdeg[var.name], index[var.name])
+        if strategy == VariableStrategy.DOM_WDEG:
+            wdeg = self._weighted_degrees
+            return lambda var: (
+                var.domain_size() / max(1, wdeg[var.name]),
+                index[var.name],
+            )
+        if strategy == VariableStrategy.IMPACT:
+            return lambda var: (-self._variable_impact(var), index[var.name])
+        if strategy == VariableStrategy.CUSTOM_ORDER:
+            custom: dict[str, int] = {}
+            for name in self.custom_order:
+                custom.setdefault(name, len(custom))
+            return lambda var: (custom.get(var.name, len(custom)), index[var.name])
+        return lambda var: (index[var.name],)
+
+    def _bump_weight(self, constraint: Constraint) -> None:
+        """Count a failure of ``constraint`` for the weighted-degree strategies."""
+        self.constraint_weights[constraint] = (
+            self.constraint_weights.get(constraint, 1) + 1
+        )
+        names = set(constraint.get_variables())
+        for name in names:
+            self._weighted_degrees[name] += 1
+        if self._variable_heap is not None and self.variable_strategy in (
+            VariableStrategy.WDEG,
+            VariableStrategy.DOM_WDEG,
+        ):
+            self._variable_heap.update(names)
+
+    def _value_impact(self, var_name: str, value: int) -> float:
+        return self.metrics.var_value_impact.get(var_name, {}).get(value, (0.0, 0))[0]
+
+    def _variable_impact(self, var: SetVariable) -> float:
+        impacts = self.metrics.var_value_impact.get(var.name)
+        if not impacts:
+            return 0.0
+        return sum(
+            impacts[value][0]
+            for value in iter_bitset(var.undetermined)
+            if value in impacts
+        )
+
+    def _record_impact(self, path: list[Operation], state) -> None:
+        """Measure the impact of the last decision of ``path``.
+
+        A set variable with k undecided values spans 2**k sets, so the search
+        space below a node is 2**s for the total s of undecided values, and
+        the impact of a decision is 1 - 2**-(reduction of s), or 1 when it
+        fails (``state`` is None). Only the inclusion of a value is recorded:
+        it is the branch value selection orders, and excluding the same value
+        narrows the space by a different amount.
+        """
+        spaces = self._spaces
+        depth = len(path)
+        if state is None:
+            impact = 1.0
+        else:
+            space = sum(var.domain_size() for var in state.values())
+            del spaces[depth:]
+            spaces.append(space)
+            if not depth:
+                return
+            impact = 1.0 - 2.0 ** (space - spaces[depth - 1])
+        op = path[-1]
+        if op.op_type != OperationType.ADD:
+            return
+        impacts = self.metrics.var_value_impact.setdefault(op.variable, {})
+        mean, count = impacts.get(op.value, (0.0, 0))
+        impacts[op.value] = (mean + (impact - mean) / (count + 1), count + 1)
+        if (
+            self._variable_heap is not None
+            and self.variable_strategy == VariableStrategy.IMPACT
+        ):
+            self._variable_heap.update((op.variable,))
+
+    def _best_variable(self, variables: dict[str, SetVariable]) -> str | None:
+        heap = self._variable_heap
+        if heap is not None and variables is heap.variables:
+            heap.update(self.state_computer.changed_variables())
+            return heap.top()
+        best = min(
+            (var for var in variables.values() if not var.is_determined()),
+            key=self._rank,
+            default=None,
+        )
+        return None if best is None else best.name
+
     def choose_variable(
         self, variables: dict[str, SetVariable]
     ) -> tuple[str, SetVariable] | None:
-        undetermined = [
-            (name, var) for name, var in variables.items() if not var.is_determined()
-        ]
-        if not undetermined:
-            return None
-
-        if self.variable_strategy == VariableStrategy.CUSTOM_ORDER:
-            ordered_vars = []
-            for var_name in self.custom_order:
-                for name, var in undetermined:
-                    if name == var_name:
-                        ordered_vars.append((name, var))
-                        break
-            remaining_vars = [
+        if self._rank is None:
+            undetermined = [
                 (name, var)
-                for name, var in undetermined
-                if name not in self.custom_order
+                for name, var in variables.items()
+                if not var.is_determined()
             ]
-            ordered_vars.extend(remaining_vars)
-
-            if not ordered_vars:
-                return None
-
-            if (
-                len(ordered_vars) <= 1
-                or self.metrics.random_choices >= 10 * self.metrics.restart_count
-            ):
-                return ordered_vars[0]
-            else:
-                print("random choice")
-                self.metrics.random_choices += 1
-                self.metrics.global_random_choices += 1
-
-                if self.restarting_strategy == RestartingStrategy.NEXT:
-                    return ordered_vars[
-                        self.metrics.restart_count % (len(ordered_vars) - 1)
-                    ]
-                elif self.restarting_strategy == RestartingStrategy.RANDOM:
-                    return random.choice(ordered_vars)
-                elif self.restarting_strategy == RestartingStrategy.CONSTRAINED_RANDOM:
-                    return random.choice(
-                        ordered_vars[
-                            min(
-                                len(ordered_vars) - 1, self.metrics.restart_count
-                            ) : min(len(ordered_vars), self.metrics.restart_count * 2)
-                        ]
-                    )
-
-        elif self.variable_strategy == VariableStrategy.RANDOM:
-            return random.choice(undetermined)
-        elif self.variable_strategy == VariableStrategy.FIRST:
-            return undetermined[0]
-        else:
-            sorted_vars = None
-            if self.variable_strategy == VariableStrategy.SMALLEST_DOMAIN:
-                sorted_vars = sorted(
-                    undetermined, key=lambda x: len(x[1].upper_bound - x[1].lower_bound)
-                )
-
-            elif self.variable_strategy == VariableStrategy.LEAST_CONSTRAINED:
-                sorted_vars = sorted(
-                    undetermined, key=lambda x: self.get_variable_constraints(x[0])
-                )
-
-            elif self.variable_strategy == VariableStrategy.MOST_CONSTRAINED:
-                sorted_vars = sorted(
-                    undetermined,
-                    key=lambda x: self.get_variable_constraints(x[0]),
-                    reverse=True,
-                )
-            else:
-                return undetermined[0]
-
-            if not sorted_vars:
-                return None
-            if (
-                len(sorted_vars) <= 1
-                or self.metrics.random_choices >= 10 * self.metrics.restart_count
-            ):
-                return sorted_vars[0]
-            else:
-                print("random choice")
-                self.metrics.random_choices += 1
-                self.metrics.global_random_choices += 1
-                if self.restarting_strategy == RestartingStrategy.NEXT:
-                    return sorted_vars[
-                        self.metrics.restart_count % (len(sorted_vars) - 1)
-                    ]
-                elif self.restarting_strategy == RestartingStrategy.RANDOM:
-                    return random.choice(sorted_vars)
-                elif self.restarting_strategy == RestartingStrategy.CONSTRAINED_RANDOM:
-                    return random.choice(
-                        sorted_vars[
-                            min(len(sorted_vars) - 1, self.metrics.restart_count) : min(
-                                len(sorted_vars), self.metrics.restart_count * 2
-                            )
-                        ]
+            return self.random.choice(undetermined) if undetermined else None
+
+        # FIRST stays deterministic across restarts
+        if (
+            self.variable_strategy == VariableStrategy.FIRST
+            or self.metrics.random_choices >= 10 * self.metrics.restart_count
+        ):
+            name = self._best_variable(variables)
+            return None if name is None else (name, variables[name])
+
+        # After a restart, a few choices are drawn among the best variables
+        rank = self._rank
+        sorted_vars = sorted(
+            ((name, var) for name, var in variables.items() if not var.is_determined()),
+            key=lambda item: rank(item[1]),
+        )
+        if len(sorted_vars) <= 1:
+            return sorted_vars[0] if sorted_vars else None
+        self.metrics.random_choices += 1
+        self.metrics.global_random_choices += 1
+        if self.restarting_strategy == RestartingStrategy.NEXT:
+            return sorted_vars[self.metrics.restart_count % (len(sorted_vars) - 1)]
+        elif self.restarting_strategy == RestartingStrategy.RANDOM:
+            return self.random.choice(sorted_vars)
+        elif self.restarting_strategy == RestartingStrategy.CONSTRAINED_RANDOM:
+            return self.random.choice(
+                sorted_vars[
+                    min(len(sorted_vars) - 1, self.metrics.restart_count) : min(
+                        len(sorted_vars), self.metrics.restart_count * 2
                     )
-                else:
-                    print("EROORORORO")
-
-    def handle_interrupt(self, signum: int, frame: object) -> None:
-        self.metrics.pretty_print(interrupted=True)
-        if self.visualizer:
-            self.visualizer.build_from_history(
-                self.operation_history,
-                self.solution_path,
-                self.variables,
-                self.constraints,
+                ]
             )
-            self.visualizer.save(f"search_tree_{time.strftime('%Y%m%d_%H%M%S')}")
-        sys.exit(1)
+        else:
+            raise ValueError(f"Unknown restarting strategy {self.restarting_strategy}")
 
     def solve(self) -> dict[str, set] | None:
+        """Search for a solution.
+
+        Returns None when there is none, or when the search was interrupted
+        (Ctrl-C or ``SearchInterrupted``), which sets ``interrupted``.
+        """
         self.state_computer = StateComputer(
-            self.metrics, constraints=self.constraints, initial_variables=self.variables
+            self.metrics,
+            constraints=self.constraints,
+            initial_variables=self.variables,
+            trail=self.backtracking_strategy == BacktrackingStrategy.TRAIL,
+            nogoods=self.nogoods,
+            cache_policy=self.cache_policy,
+            cache_max_entries=self.cache_max_entries,
+            cache_max_bytes=self.cache_max_bytes,
         )
-
+        if not self._weighted_degrees:
+            self._weighted_degrees = {
+                name: self.get_variable_constraints(name) for name in self.variables
+            }
+        self._rank = self._ranking()
+        # The trail store is updated in place, so its ranking can be too
+        self._variable_heap = None
+        if self._rank is not None and self.state_computer.trail is not None:
+            self._variable_heap = VariableHeap(self.state_computer.store, self._rank)
+
+        self.metrics.restart_cutoff = self.restart_policy.cutoff(
+            self.metrics.restart_count
+        )
+        if self.record_trace and self.trace is None:
+            self.trace = DecisionTrace(list(self.variables))
+        if self.replay is not None:
+            self._replay_events = self.replay.events()
+            self._replay_next = next(self._replay_events, None)
+        self.interrupted = False
         try:
-            while not self.restarting:
-                try:
-                    self.restarting = False
-
-                    solution = self._solve([])
-
-                    if self.visualizer:
-                        self.visualizer.build_from_history(
-                            self.operation_history,
-                            self.solution_path,
-                            self.variables,
-                            self.constraints,
-                        )
-                        self.visualizer.save(
-                            f"search_tree_{time.strftime('%Y%m%d_%H%M%S')}"
-                        )
-                    self.metrics.pretty_print(interrupted=False)
-                    return solution
-                except Restarting:
-                    ...
-        except KeyboardInterrupt:
+            while True:
+                self.restarting = False
+                solution = self._search()
+                if not self.restarting:
+                    break
+                if self.trace is not None:
+                    self.trace.restart(self.metrics.branches)
+                self._restart()
+                for hook in self.hooks:
+                    hook.on_restart(self)
+            if self.trace is not None:
+                self.trace.end(self.metrics.branches)
 
             if self.visualizer:
                 self.visualizer.build_from_history(
@@ -241,29 +418,66 @@ class SetSolver:
                     self.constraints,
                 )
                 self.visualizer.save(f"search_tree_{time.strftime('%Y%m%d_%H%M%S')}")
-            self.metrics.pretty_print(interrupted=True)
+            self.reporter.summary(self.metrics, interrupted=False)
+            return solution
+        except (KeyboardInterrupt, SearchInterrupted):
+            self.interrupted = True
+            if self.visualizer:
+                self.visualizer.build_from_history(
+                    self.operation_history,
+                    self.solution_path,
+                    self.variables,
+                    self.constraints,
+                )
+                self.visualizer.save(f"search_tree_{time.strftime('%Y%m%d_%H%M%S')}")
+            self.reporter.summary(self.metrics, interrupted=True)
             return None
 
-    def _restart(self, current_path):
-        if self.metrics.max_depth_hits >= 10 + self.metrics.max_depth:
-            self.metrics.current_depth = 0
-            self.metrics.max_depth = 0
-            self.metrics.max_depth_hits = 0
-            self.visited_states.clear()
-            self.operation_history.clear()
-            self.solution_path.clear()
-            self.metrics.restart_count += 1
-            self.metrics.random_choices = 0
-            raise Restarting()
+    def _restart(self) -> None:
+        """Start a new run from the root.
+
+        Learned nogoods, constraint weights and impacts are kept; only the
+        per-run bookkeeping is reset.
+        """
+        self.metrics.current_depth = 0
+        self.metrics.max_depth = 0
+        self.metrics.max_depth_hits = 0
+        self.visited_states.clear()
+        self.operation_history.clear()
+        self.solution_path.clear()
+        self._operations.clear()
+        self.metrics.restart_count += 1
+        self.metrics.random_choices = 0
+        self.metrics.run_failures = 0
+        self.metrics.restart_cutoff = self.restart_policy.cutoff(
+            self.metrics.restart_count
+        )
+
+    def _restart_due(self) -> bool:
+        if self.replay is None:
+            return self.restart_policy.should_restart(self.metrics)
+        event = self._replay_next
+        if event is not None and event == ("restart", self.metrics.branches):
+            self._replay_next = next(self._replay_events, None)
+            return True
         return False
 
+    def _fail(self) -> None:
+        self.metrics.failures += 1
+        self.metrics.run_failures += 1
+
     def _choose_value(self, var: SetVariable) -> list[int]:
-        undetermined = list(var.upper_bound - var.lower_bound)
+        undetermined = list(iter_bitset(var.undetermined))
 
         if self.value_strategy == VariableValueStrategy.RANDOM:
-            random.shuffle(undetermined)
+            self.random.shuffle(undetermined)
             return undetermined
 
+        elif self.value_strategy == VariableValueStrategy.IMPACT:
+            return sorted(
+                undetermined, key=lambda value: self._value_impact(var.name, value)
+            )
+
         elif self.value_strategy == VariableValueStrategy.LOWEST_FREQUENCY:
             return sorted(
                 undetermined,
@@ -274,115 +488,153 @@ class SetSolver:
         return undetermined
 
     def _assignments_to_nogood(self, current_path: list[Operation]) -> NoGood:
-        relevant_assignments = set()
-        for op in reversed(current_path):
-            if not any(a[0] == op.variable for a in relevant_assignments):
-                relevant_assignments.add(
-                    (op.variable, op.op_type == OperationType.ADD, op.value)
-                )
-        return NoGood(frozenset(relevant_assignments))
-
-    def _violates_nogood(self, current_path: list[Operation]) -> bool:
-        current_assignments = {}
-        for op in current_path:
-            current_assignments[op.variable] = (
-                op.variable,
-                op.op_type == OperationType.ADD,
-                op.value,
-            )
-        current_set = set(current_assignments.values())
-
-        for nogood in self.nogoods:
-            matches = True
-            for assignment in nogood.assignments:
-                var = assignment[0]
-                if var in current_assignments:
-                    if current_assignments[var] != assignment:
-                        matches = False
-                        break
-                else:
-                    matches = False
-                    break
-            if matches:
-                self.metrics.nogood_hits += 1
-                return True
-        return False
+        # Every decision of the failed path: any path deciding all of them
+        # (in any order) reaches a state at least as tight, so it fails too
+        return NoGood(frozenset(operation_literal(op) for op in current_path))
 
-    def _learn_nogood(self, failed_path: list[Operation]):
+    def _learn_nogood(self, failed_path: list[Operation], nogood: NoGood | None = None):
         if failed_path:
-            nogood = self._assignments_to_nogood(failed_path)
-            if nogood not in self.nogoods:
-                self.nogoods.add(nogood)
+            if nogood is None:
+                nogood = self._assignments_to_nogood(failed_path)
+            if self.nogoods.add(nogood):
                 self.metrics.nogoods_learned += 1
 
-    def _solve(self, current_path: list[Operation]) -> dict[str, set] | None:
-        if self._violates_nogood(current_path):
-            return None
-
-        if not self.restarting:
-            self.metrics.branches += 1
-        print(
-            f"Branches: {self.metrics.branches:,d} | "
-            f"Max Depth: {self.metrics.max_depth} | "
-            f"Current Depth: {self.metrics.current_depth} | "
-            f"Max Depth Hits: {int(self.metrics.max_depth_hits)}",
-        )
-
-        if self._restart(current_path):
-            self.metrics.current_depth = len(current_path)
-            return None
-        path_tuple = tuple(current_path)
-
-        if path_tuple in self.visited_states:
+    def _operation(
+        self, var_name: str, op_type: OperationType, value: int, depth: int
+    ) -> Operation:
+        """Interned decision: every (variable, type, value, depth) is built once.
+
+        The table only lives for one run and is bounded in size, as the depths
+        a long search reaches would otherwise keep adding entries.
+        """
+        key = (var_name, op_type, value, depth)
+        op = self._operations.get(key)
+        if op is None:
+            if len(self._operations) >= _MAX_INTERNED_OPERATIONS:
+                self._operations.clear()
+            op = self._operations[key] = Operation(var_name, op_type, value, depth)
+        return op
+
+    def _decide(self, op: Operation) -> bool:
+        """Open the child node of ``op``; False if a nogood already forbids it."""
+        self.operation_history.append(op)
+        if self.state_computer.trail is not None:
+            # Decisions reach the nogood store through the trail
+            self.state_computer.push_level()
+            return True
+        literal = operation_literal(op)
+        if self.nogoods.push(literal) is not None:
+            self.nogoods.pop(literal)
+            self.metrics.nogood_hits += 1
+            self._fail()
+            return False
+        return True
+
+    def _undo(self, op: Operation) -> None:
+        if self.state_computer.trail is not None:
+            self.state_computer.pop_level()
+        else:
+            self.nogoods.pop(operation_literal(op))
+        for hook in self.hooks:
+            hook.on_backtrack(self, self.decisions, op)
+
+    def _expand(
+        self, path: list[Operation], fingerprint: int
+    ) -> dict[str, set] | tuple[str, list[int]] | None:
+        """Visit the node reached by ``path``.
+
+        Returns the solution found there, the variable and values to branch
+        on, or None when the node fails.
+        """
+        self.metrics.branches += 1
+        self.reporter.tick(self.metrics)
+
+        if fingerprint in self.visited_states:
             return None
-        self.visited_states.add(path_tuple)
+        self.visited_states.add(fingerprint)
 
         try:
-            current_state = self.state_computer.compute_state(path_tuple)
+            current_state = self.state_computer.compute_state(path)
         except ValueError:
-            self._learn_nogood(current_path)
+            self._fail()
+            if (
+                self.state_computer.failed_constraint is not None
+                and self.replay is None
+            ):
+                self._bump_weight(self.state_computer.failed_constraint)
+            self._learn_nogood(path, self.state_computer.conflict_nogood)
+            if self._measure_impact and path:
+                self._record_impact(path, None)
+            for hook in self.hooks:
+                hook.on_conflict(self, path)
             return None
+        if self._measure_impact:
+            self._record_impact(path, current_state)
 
-        self.metrics.current_depth = len(current_path)
+        self.metrics.current_depth = len(path)
         if self.metrics.current_depth > self.metrics.max_depth:
             self.metrics.max_depth_hits = 0
             self.metrics.max_depth = self.metrics.current_depth
             if self.metrics.global_max_depth < self.metrics.max_depth:
                 self.metrics.global_max_depth = self.metrics.max_depth
-
-        if all(constraint.evaluate(current_state) for constraint in self.constraints):
+        for hook in self.hooks:
+            hook.on_node(self, path, current_state)
+
+        # Retired constraints are entailed, hence satisfied by the lower bounds
+        if all(
+            constraint.evaluate(current_state)
+            for constraint in self.state_computer.active_constraints()
+        ):
             solution = {name: var.lower_bound for name, var in current_state.items()}
             self.metrics.solution = solution
-            self.solution_path = current_path.copy()
+            self.solution_path = path.copy()
+            for hook in self.hooks:
+                hook.on_solution(self, path, solution)
             return solution
 
-        var_tuple = self.choose_variable(current_state)
+        if self.replay is None:
+            branch = self._branch(current_state)
+        else:
+            branch = self._replayed_branch(current_state)
+        if branch is None:
+            self._fail()
+            self._learn_nogood(path)
+        return branch
+
+    def _branch(self, state: dict[str, SetVariable]) -> tuple[str, list[int]] | None:
+        var_tuple = self.choose_variable(state)
         if var_tuple is None:
-            self._learn_nogood(current_path)
             return None
-
         var_name, var = var_tuple
-        elements = self._choose_value(var)
-
-        for element in elements:
-            if not self.restarting:
-                self.metrics.var_value_frequency[var_name][element] += 1
-            add_op = Operation(var_name, OperationType.ADD, element, len(current_path))
-            self.operation_history.append(add_op)
-            solution = self._solve(current_path + [add_op])
-
-            if solution:
-                return solution
-
-            remove_op = Operation(
-                var_name, OperationType.REMOVE, element, len(current_path)
-            )
-            self.operation_history.append(remove_op)
-            solution = self._solve(current_path + [remove_op])
-
-            if solution:
-                return solution
+        values = self._choose_value(var)
+        if self.trace is not None:
+            self.trace.branch(var_name, values)
+        return var_name, values
+
+    def _replayed_branch(
+        self, state: dict[str, SetVariable]
+    ) -> tuple[str, list[int]] | None:
+        """The next branching of the replayed trace, checked against ``state``."""
+        event = self._replay_next
+        leaf = all(var.is_determined() for var in state.values())
+        if event is None and not leaf:
+            # The recorded search was interrupted before this node
+            raise SearchInterrupted()
+        if event is not None and event[0] == "branch":
+            _, var_name, values = event
+            undetermined = state[var_name].undetermined
+            if all(undetermined >> value & 1 for value in values):
+                self._replay_next = next(self._replay_events, None)
+                return var_name, values
+        # A failed leaf records no branching
+        if leaf:
+            return None
+        raise ValueError(
+            f"Replay diverged from the trace at node {self.metrics.branches}: {event}"
+        )
 
+    def _exhausted(self) -> None:
+        """Bookkeeping once every child of the current node has failed."""
         if self.metrics.current_depth == self.metrics.max_depth:
             self.metrics.max_depth_hits += 1
         elif self.metrics.current_depth + 10 >= self.metrics.max_depth:
@@ -393,4 +645,62 @@ class SetSolver:
             self.metrics.max_depth_hits += 0.01
 
         self.metrics.current_depth -= 1
-        return None
+
+    def _search(self) -> dict[str, set] | None:
+        """Depth-first search driven by an explicit stack instead of recursion.
+
+        ``self.decisions`` holds the decisions from the root to the current
+        node and is reused across nodes. Each expanded node on it has a frame
+        [variable, values, next child, fingerprint]; child 2k adds value k
+        and child 2k + 1 removes it. Open decisions are undone on the way out,
+        whether the search ends, finds a solution or restarts. A run cut off
+        by the restart policy (or the replayed trace) returns None with
+        ``restarting`` set.
+        """
+        path = self.decisions
+        path.clear()
+        frames: list[list] = []
+        fingerprint = 0
+        try:
+            while True:
+                if self._restart_due():
+                    self.restarting = True
+                    return None
+                outcome = self._expand(path, fingerprint)
+                if type(outcome) is dict:
+                    return outcome
+                if outcome is not None:
+                    frames.append([outcome[0], outcome[1], 0, fingerprint])
+
+                # Move on to the next child, backtracking as needed
+                while True:
+                    if not frames:
+                        return None
+                    frame = frames[-1]
+                    if len(path) == len(frames):
+                        self._undo(path.pop())
+                    var_name, values, child, parent_fingerprint = frame
+                    if child == 2 * len(values):
+                        frames.pop()
+                        self._exhausted()
+                        continue
+                    frame[2] = child + 1
+                    value = values[child >> 1]
+                    if child & 1:
+                        op_type = OperationType.REMOVE
+                    else:
+                        op_type = OperationType.ADD
+                        if self._count_frequencies:
+                            self.metrics.var_value_frequency[var_name][value] += 1
+                    op = self._operation(var_name, op_type, value, len(path))
+                    if self._decide(op):
+                        path.append(op)
+                        fingerprint = extend_fingerprint(
+                            parent_fingerprint, op, self.fingerprint_bits
+                        )
+                        for hook in self.hooks:
+                            hook.on_decision(self, path, op)
+                        break
+        finally:
+            while path:
+                self._undo(path.pop())
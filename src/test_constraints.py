@@ -0,0 +1,254 @@
+import itertools
+import random
+from functools import reduce
+
+import pytest
+
+from src.constraints import LexicographicOrdering, MeetAtMostOnce, Partition
+from src.variables import Conflict, SetVariable, iter_bitset
+
+
+def _lex_less(set1: int, set2: int) -> bool:
+    return list(iter_bitset(set1)) < list(iter_bitset(set2))
+
+
+def _sets(lower: int, upper: int):
+    """Every set between the bounds ``lower`` and ``upper``."""
+    free = list(iter_bitset(upper & ~lower))
+    for size in range(len(free) + 1):
+        for values in itertools.combinations(free, size):
+            yield lower | sum(1 << value for value in values)
+
+
+def _bounds(values: int):
+    """Every (lower, upper) bound pair over ``values`` values."""
+    for upper in range(1 << values):
+        for lower in _sets(0, upper):
+            yield lower, upper
+
+
+def _check_lex(lower1: int, upper1: int, lower2: int, upper2: int) -> None:
+    """Compare the lex propagator and its entailment test to enumeration."""
+    solutions = [
+        (set1, set2)
+        for set1 in _sets(lower1, upper1)
+        for set2 in _sets(lower2, upper2)
+        if _lex_less(set1, set2)
+    ]
+    constraint = LexicographicOrdering("A", "B")
+    state = {
+        "A": SetVariable.from_bitsets("A", lower1, upper1),
+        "B": SetVariable.from_bitsets("B", lower2, upper2),
+    }
+    if not solutions:
+        with pytest.raises(Conflict):
+            constraint.filter_domains(state)
+        return
+
+    constraint.filter_domains(state)
+    firsts = [set1 for set1, _ in solutions]
+    seconds = [set2 for _, set2 in solutions]
+    # Bound consistency: the new bounds are exactly the hull of the solutions
+    assert (
+        state["A"]._lower_bound,
+        state["A"]._upper_bound,
+        state["B"]._lower_bound,
+        state["B"]._upper_bound,
+    ) == (
+        reduce(int.__and__, firsts),
+        reduce(int.__or__, firsts),
+        reduce(int.__and__, seconds),
+        reduce(int.__or__, seconds),
+    ), (
+        bin(lower1),
+        bin(upper1),
+        bin(lower2),
+        bin(upper2),
+    )
+
+    entailed = all(
+        _lex_less(set1, set2)
+        for set1 in _sets(state["A"]._lower_bound, state["A"]._upper_bound)
+        for set2 in _sets(state["B"]._lower_bound, state["B"]._upper_bound)
+    )
+    assert constraint.is_entailed(state) == entailed
+
+
+def test_lex_exhaustive_over_four_values():
+    bounds = list(_bounds(4))
+    for (lower1, upper1), (lower2, upper2) in itertools.product(bounds, bounds):
+        _check_lex(lower1, upper1, lower2, upper2)
+
+
+def test_lex_random_over_six_values():
+    rng = random.Random(1)
+
+    def random_bounds():
+        upper = rng.getrandbits(6)
+        return upper & rng.getrandbits(6) & rng.getrandbits(6), upper
+
+    for _ in range(3000):
+        _check_lex(*random_bounds(), *random_bounds())
+
+
+def _partitions(sets, universe: int, size, ordered=False) -> bool:
+    union = 0
+    for values in sets:
+        if union & values or (size is not None and values.bit_count() != size):
+            return False
+        union |= values
+    if ordered:
+        starts = [(values & -values).bit_length() for values in sets]
+        if 0 in starts or starts != sorted(set(starts)):
+            return False
+    return union == universe
+
+
+def _meet_at_most_once(sets) -> bool:
+    return all(
+        (first & second).bit_count() <= 1
+        for first, second in itertools.combinations(sets, 2)
+    )
+
+
+def _implied(reason, fact, names, solutions) -> bool:
+    """Whether every solution meeting the literals of ``reason`` meets ``fact``."""
+    for sets in solutions:
+        values = dict(zip(names, sets))
+        if all(
+            (values[name] & mask == mask) if included else not values[name] & mask
+            for name, included, mask in reason
+        ) and not fact(values):
+            return False
+    return True
+
+
+def _check_global(
+    constraint, reference, rng: random.Random, everything=None, loose=False
+) -> None:
+    """Soundness of ``constraint`` over three random variables, by enumeration.
+
+    When ``everything`` lists the solutions over the whole universe, the
+    reason of every change and conflict is checked against them too. Loose
+    domains have wide bounds and no stated cardinality, so that they rarely
+    fail before the constraint gets to its own reasoning.
+    """
+    names = constraint.get_variables()
+    domains = []
+    for name in names:
+        upper = rng.getrandbits(4) | (rng.getrandbits(4) if loose else 0)
+        lower = upper & rng.getrandbits(4) & rng.getrandbits(4)
+        if loose:
+            lower &= rng.getrandbits(4)
+            card_min, card_max = 0, upper.bit_count()
+        else:
+            card_min = rng.randint(0, upper.bit_count())
+            card_max = rng.randint(card_min, upper.bit_count())
+        domains.append((name, lower, upper, card_min, card_max))
+
+    def candidates(lower, upper, card_min, card_max):
+        return [s for s in _sets(lower, upper) if card_min <= s.bit_count() <= card_max]
+
+    assignments = list(itertools.product(*(candidates(*d[1:]) for d in domains)))
+    solutions = [sets for sets in assignments if reference(sets)]
+
+    # Determined variables are accepted exactly on solutions
+    for sets in assignments:
+        fixed = {
+            name: SetVariable.from_bitsets(name, s, s) for name, s in zip(names, sets)
+        }
+        assert constraint.evaluate(fixed) == reference(sets)
+
+    if everything is not None:
+        # The stated cardinality intervals hold at the root, without a literal
+        everything = [
+            sets
+            for sets in everything
+            if all(d[3] <= s.bit_count() <= d[4] for d, s in zip(domains, sets))
+        ]
+    state = {
+        name: SetVariable.from_bitsets(name, lower, upper, card_min, card_max)
+        for name, lower, upper, card_min, card_max in domains
+    }
+    trail = []
+    for var in state.values():
+        var._trail = trail
+    try:
+        constraint.filter_domains(state)
+    except Conflict as conflict:
+        assert not solutions, domains
+        if everything is not None and conflict.reason is not None:
+            assert _implied(conflict.reason, lambda _: False, names, everything)
+        return
+    if everything is not None:
+        for var, _, _, included, changed, reason, _ in trail:
+            if not changed or reason is None:
+                continue
+            if included:
+                fact = lambda values: values[var.name] & changed == changed
+            else:
+                fact = lambda values: not values[var.name] & changed
+            assert _implied(reason, fact, names, everything), (domains, reason)
+    # No solution is pruned
+    for sets in solutions:
+        for name, values in zip(names, sets):
+            var = state[name]
+            assert values & var._lower_bound == var._lower_bound, domains
+            assert values & ~var._upper_bound == 0, domains
+            assert var.card_min <= values.bit_count() <= var.card_max, domains
+
+
+def test_partition_is_sound():
+    rng = random.Random(3)
+    everything = {}
+    for _ in range(1500):
+        universe = rng.choice([0b111, 0b1111, 0b1011])
+        size = rng.choice([None, 1, 2])
+        ordered = rng.random() < 0.5
+        key = (universe, size, ordered)
+        if key not in everything:
+            everything[key] = [
+                sets
+                for sets in itertools.product(range(16), repeat=3)
+                if _partitions(sets, universe, size, ordered)
+            ]
+        constraint = Partition(["A", "B", "C"], iter_bitset(universe), size, ordered)
+        _check_global(
+            constraint,
+            lambda sets: _partitions(sets, universe, size, ordered),
+            rng,
+            everything[key],
+            loose=rng.random() < 0.5,
+        )
+
+
+def test_ordered_partition_explains_its_changes():
+    rng = random.Random(11)
+    universe = 0b1111
+    everything = [
+        sets
+        for sets in itertools.product(range(16), repeat=3)
+        if _partitions(sets, universe, None, True)
+    ]
+    constraint = Partition(["A", "B", "C"], iter_bitset(universe), ordered=True)
+    for _ in range(1000):
+        _check_global(
+            constraint,
+            lambda sets: _partitions(sets, universe, None, True),
+            rng,
+            everything,
+            loose=True,
+        )
+
+
+def test_meet_at_most_once_is_sound():
+    rng = random.Random(4)
+    everything = [
+        sets
+        for sets in itertools.product(range(16), repeat=3)
+        if _meet_at_most_once(sets)
+    ]
+    for _ in range(1500):
+        _check_global(
+            MeetAtMostOnce(["A", "B", "C"]), _meet_at_most_once, rng, everything
+        )
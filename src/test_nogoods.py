@@ -0,0 +1,74 @@
+import random
+
+from src.misc import NoGood
+from src.nogoods import NoGoodStore
+
+LITERALS = [
+    (name, included, value)
+    for name in "AB"
+    for included in (True, False)
+    for value in range(3)
+]
+
+
+def test_watches_detect_every_completed_nogood():
+    """Compare the watched-literal store to a scan of every nogood."""
+    rng = random.Random(5)
+    for _ in range(200):
+        store = NoGoodStore(budget=None)
+        decided: list = []
+        for _ in range(60):
+            action = rng.random()
+            if action < 0.25:
+                nogood = NoGood(frozenset(rng.sample(LITERALS, rng.randint(1, 4))))
+                # Learned nogoods are never complete when they are added
+                if not nogood.assignments <= set(decided):
+                    store.add(nogood)
+            elif action < 0.3:
+                deleted = set(store)
+                store.reduce()
+                deleted -= set(store)
+                assert all(
+                    len(nogood.assignments) > store.keep_size for nogood in deleted
+                )
+            elif action < 0.5 and decided:
+                mark = rng.randint(0, len(decided))
+                store.pop_to(mark)
+                del decided[mark:]
+            else:
+                undecided = [lit for lit in LITERALS if lit not in decided]
+                if not undecided:
+                    continue
+                literal = rng.choice(undecided)
+                violated = store.push(literal)
+                decided.append(literal)
+                completed = [
+                    nogood
+                    for nogood in store
+                    if literal in nogood.assignments
+                    and nogood.assignments <= set(decided)
+                ]
+                if completed:
+                    assert violated in completed
+                    store.pop(literal)
+                    decided.pop()
+                else:
+                    assert violated is None
+
+
+def test_units_report_the_last_undecided_literal():
+    store = NoGoodStore(budget=None)
+    store.units = []
+    a, b, c = ("A", True, 0), ("B", False, 1), ("A", False, 2)
+    store.add(NoGood(frozenset((a, b, c))))
+    assert store.push(a) is None
+    assert store.take_units() == []
+    assert store.push(b) is None
+    [(literal, others)] = store.take_units()
+    assert literal == c and set(others) == {a, b}
+
+    # Once undone, the nogood is no longer unit
+    store.pop_to(1)
+    assert store.push(c) is None
+    [(literal, others)] = store.take_units()
+    assert literal == b and set(others) == {a, c}
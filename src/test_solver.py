@@ -0,0 +1,201 @@
+import itertools
+import random
+
+from src.constraints import (
+    CardinalityConstraint,
+    Difference,
+    Different,
+    Intersection,
+    IntersectionConstraintCardinality,
+    LexicographicOrdering,
+    MeetAtMostOnce,
+    Partition,
+    Subset,
+    Union,
+)
+from src.restarts import RestartPolicy, RestartSchedule
+from src.solver import (
+    BacktrackingStrategy,
+    SearchHook,
+    SetSolver,
+    VariableStrategy,
+    VariableValueStrategy,
+)
+from src.variables import SetVariable
+
+VALUES = 4
+NAMES = ["A", "B", "C"]
+
+
+def _random_model(rng: random.Random, max_constraints: int = 4):
+    """Bounds of three set variables over four values, and a few constraints."""
+    bounds = {}
+    for name in NAMES:
+        upper = rng.getrandbits(VALUES) | rng.getrandbits(VALUES)
+        bounds[name] = (
+            upper & rng.getrandbits(VALUES) & rng.getrandbits(VALUES),
+            upper,
+        )
+    universe = range(VALUES)
+    makers = [
+        lambda a, b, c: Union(a, b, c),
+        lambda a, b, c: Intersection(a, b, c),
+        lambda a, b, c: Difference(a, b, c),
+        lambda a, b, c: Subset(a, b),
+        lambda a, b, c: Different(a, b),
+        lambda a, b, c: IntersectionConstraintCardinality(a, b, rng.randint(0, 2)),
+        lambda a, b, c: CardinalityConstraint(a, rng.randint(0, 3)),
+        lambda a, b, c: LexicographicOrdering(a, b),
+        lambda a, b, c: Partition([a, b, c], universe),
+        lambda a, b, c: Partition([a, b, c], universe, ordered=True),
+        lambda a, b, c: MeetAtMostOnce([a, b, c]),
+    ]
+    constraints = [
+        rng.choice(makers)(*rng.sample(NAMES, 3))
+        for _ in range(rng.randint(1, max_constraints))
+    ]
+    return bounds, constraints
+
+
+def _solutions(bounds, constraints) -> list[dict[str, int]]:
+    """Every assignment within ``bounds`` satisfying ``constraints``."""
+    choices = []
+    for name in NAMES:
+        lower, upper = bounds[name]
+        free = upper & ~lower
+        choices.append([lower | sub for sub in range(free + 1) if sub & ~free == 0])
+    solutions = []
+    for sets in itertools.product(*choices):
+        state = {
+            name: SetVariable.from_bitsets(name, value, value)
+            for name, value in zip(NAMES, sets)
+        }
+        if all(constraint.evaluate(state) for constraint in constraints):
+            solutions.append(dict(zip(NAMES, sets)))
+    return solutions
+
+
+def _solver(bounds, constraints, **options) -> SetSolver:
+    solver = SetSolver(**options)
+    for name in NAMES:
+        lower, upper = bounds[name]
+        solver.add_variable(SetVariable.from_bitsets(name, lower, upper))
+    for constraint in constraints:
+        solver.add_constraint(constraint)
+    return solver
+
+
+def _as_bitsets(solution: dict[str, set[int]]) -> dict[str, int]:
+    return {
+        name: sum(1 << value for value in values) for name, values in solution.items()
+    }
+
+
+class _StateRecorder(SearchHook):
+    """Records the path and the bounds of every propagated node."""
+
+    def __init__(self):
+        self.nodes = []
+
+    def on_node(self, solver, path, state) -> None:
+        self.nodes.append(
+            (
+                tuple(str(op) for op in path),
+                {
+                    name: (
+                        var._lower_bound,
+                        var._upper_bound,
+                        var.card_min,
+                        var.card_max,
+                    )
+                    for name, var in state.items()
+                },
+            )
+        )
+
+
+def test_trail_and_copy_modes_agree():
+    rng = random.Random(2)
+    for _ in range(300):
+        bounds, constraints = _random_model(rng)
+        solutions = _solutions(bounds, constraints)
+        runs = []
+        # Copy mode with a single cached state replays most nodes from the root
+        for mode, cache_size in (
+            (BacktrackingStrategy.TRAIL, None),
+            (BacktrackingStrategy.COPY, None),
+            (BacktrackingStrategy.COPY, 1),
+        ):
+            recorder = _StateRecorder()
+            # A deterministic search without learning expands the same tree
+            solver = _solver(
+                bounds,
+                constraints,
+                variable_strategy=VariableStrategy.FIRST,
+                value_strategy=VariableValueStrategy.SIMPLE,
+                backtracking_strategy=mode,
+                cache_max_entries=cache_size,
+                restart_policy=RestartPolicy(RestartSchedule.NEVER),
+                max_nogood_size=0,
+            )
+            solver.add_hook(recorder)
+            solution = solver.solve()
+            assert (solution is None) == (not solutions)
+            if solution is not None:
+                assert _as_bitsets(solution) in solutions
+            runs.append((solution, recorder.nodes))
+        assert runs[0] == runs[1] == runs[2], [str(c) for c in constraints]
+
+
+def _holds(nogood, solution: dict[str, int]) -> bool:
+    """Whether every literal of ``nogood`` is true in ``solution``."""
+    return all(
+        bool(solution[name] >> value & 1) == included
+        for name, included, value in nogood.assignments
+    )
+
+
+def test_learning_matches_search_without_learning():
+    configurations = [
+        # First-UIP learning, with root-level units kept across restarts
+        dict(restart_policy=RestartPolicy(RestartSchedule.LUBY, scale=1)),
+        # A database small enough to be reduced all the time
+        dict(restart_policy=RestartPolicy(RestartSchedule.NEVER), nogood_budget=4),
+        # Decision nogoods of copy mode
+        dict(
+            backtracking_strategy=BacktrackingStrategy.COPY,
+            restart_policy=RestartPolicy(RestartSchedule.NEVER),
+        ),
+        # No learning at all
+        dict(restart_policy=RestartPolicy(RestartSchedule.NEVER), max_nogood_size=0),
+    ]
+    rng = random.Random(6)
+    for _ in range(200):
+        bounds, constraints = _random_model(rng, max_constraints=6)
+        solutions = _solutions(bounds, constraints)
+        for seed, options in enumerate(configurations):
+            solver = _solver(bounds, constraints, seed=seed, **options)
+            learned = []
+            add = solver.nogoods.add
+
+            def record(nogood, add=add, learned=learned):
+                learned.append(nogood)
+                return add(nogood)
+
+            solver.nogoods.add = record
+            solution = solver.solve()
+            assert (solution is None) == (not solutions), options
+            if solution is not None:
+                assert _as_bitsets(solution) in solutions
+            # A learned nogood may only exclude assignments without a solution
+            for nogood in learned:
+                assert not any(_holds(nogood, s) for s in solutions), str(nogood)
+
+
+def test_variable_constraints_are_counted_before_solving():
+    solver = _solver(
+        {name: (0, 0b1111) for name in NAMES},
+        [Subset("A", "B"), Union("A", "B", "C"), CardinalityConstraint("A", 2)],
+    )
+    assert [solver.get_variable_constraints(name) for name in NAMES] == [3, 2, 1]
+    assert solver.get_variable_constraints("D") == 0
@@ -0,0 +1,167 @@
+import random
+
+from src.variables import (
+    EVENT_CARD,
+    EVENT_FIXED,
+    EVENT_LOWER,
+    EVENT_UPPER,
+    Conflict,
+    SetVariable,
+)
+
+VALUES = 4
+
+
+def _trailed(lower: int, upper: int, card_min: int = 0, card_max=None) -> SetVariable:
+    var = SetVariable.from_bitsets("X", lower, upper, card_min, card_max)
+    var._trail = []
+    return var
+
+
+def test_include_up_to_the_maximum_fixes_the_set():
+    var = _trailed(0, 0b1111, 2, 2)
+    assert var.include(0b0001, (("R", True, 1),))
+    assert not var.is_determined()
+    var._events = 0
+    assert var.include(0b0010, (("S", True, 1),))
+    assert var._upper_bound == var._lower_bound == 0b0011
+    assert var._events == EVENT_LOWER | EVENT_UPPER | EVENT_FIXED
+    # Values are dropped because the lower bound reached the maximum
+    *_, settle = var._trail
+    assert settle[3:6] == (False, 0b1100, (("X", True, 0b0011),))
+    assert var.card_max_reason() == (("X", False, ~0b0011),)
+
+
+def test_restrict_down_to_the_minimum_fixes_the_set():
+    var = _trailed(0, 0b1111, 2, 3)
+    assert var.restrict(0b0110, (("R", True, 1),))
+    assert var._lower_bound == var._upper_bound == 0b0110
+    *_, settle = var._trail
+    assert settle[3:6] == (True, 0b0110, (("X", False, ~0b0110),))
+    assert var.card_min_reason() == (("X", True, 0b0110),)
+
+
+def test_bound_cardinality_settles_with_its_reason():
+    var = _trailed(0b1000, 0b1011)
+    reason = (("R", True, 1),)
+    assert var.bound_cardinality(1, 1, reason)
+    assert var._events & EVENT_CARD
+    assert var._lower_bound == var._upper_bound == 0b1000
+    *_, settle = var._trail
+    assert settle[3:6] == (False, 0b0011, reason + (("X", True, 0b1000),))
+
+    var = _trailed(0, 0b0101)
+    assert var.bound_cardinality(2, None, reason)
+    assert var._lower_bound == 0b0101
+    # The stated minimum now explains itself by the lower bound
+    assert var.card_min_reason() == (("X", True, 0b0101),)
+    assert var._card_reasons[0] == reason
+
+
+def test_stated_interval_keeps_its_reason():
+    var = _trailed(0, 0b1111)
+    reason = (("R", True, 1),)
+    var.bound_cardinality(0, 2, reason)
+    assert var.card_max_reason() == reason
+    var.include(0b0001, (("S", True, 1),))
+    assert var.card_max_reason() == reason
+    try:
+        var.include(0b0110, (("T", True, 1),))
+    except Conflict as conflict:
+        assert set(conflict.reason) >= {("T", True, 1), ("R", True, 1)}
+    else:
+        raise AssertionError("three values exceed a maximum of two")
+
+
+def _holds(literal, world: int, assumptions: dict[str, object]) -> bool:
+    name, included, mask = literal
+    if name == "X":
+        return world & mask == mask if included else world & mask == 0
+    return assumptions[name](world)
+
+
+def _implied(reason, fact, worlds, assumptions) -> bool:
+    """Whether every world satisfying ``reason`` satisfies ``fact``."""
+    return all(
+        fact(world)
+        for world in worlds
+        if all(_holds(literal, world, assumptions) for literal in reason)
+    )
+
+
+def test_explanations_are_sound():
+    """Every change and conflict is implied by its reason, by enumeration.
+
+    A random sequence of include, restrict and bound_cardinality calls is made,
+    each with its own assumption literal standing for the condition it imposes.
+    """
+    rng = random.Random(7)
+    for _ in range(3000):
+        upper = rng.getrandbits(VALUES)
+        lower = upper & rng.getrandbits(VALUES) & rng.getrandbits(VALUES)
+        card_min = rng.randint(0, upper.bit_count())
+        card_max = rng.randint(card_min, upper.bit_count())
+        var = _trailed(lower, upper, card_min, card_max)
+        worlds = [
+            world
+            for world in range(1 << VALUES)
+            if world & lower == lower
+            and world & ~upper == 0
+            and card_min <= world.bit_count() <= card_max
+        ]
+
+        assumptions = {}
+        for i in range(rng.randint(1, 4)):
+            name = f"R{i}"
+            reason = ((name, True, 1),)
+            kind = rng.randrange(3)
+            mask = rng.getrandbits(VALUES)
+            low = rng.randint(0, VALUES)
+            high = rng.randint(low, VALUES)
+            if kind == 0:
+                assumptions[name] = lambda world, mask=mask: world & mask == mask
+                call = lambda: var.include(mask, reason)
+            elif kind == 1:
+                assumptions[name] = lambda world, mask=mask: world & ~mask == 0
+                call = lambda: var.restrict(mask, reason)
+            else:
+                assumptions[name] = lambda world, low=low, high=high: (
+                    low <= world.bit_count() <= high
+                )
+                call = lambda: var.bound_cardinality(low, high, reason)
+            try:
+                call()
+            except Conflict as conflict:
+                assert _implied(
+                    conflict.reason, lambda world: False, worlds, assumptions
+                )
+                break
+
+            for _, _, _, included, changed, why, _ in var._trail:
+                if not changed:
+                    continue
+                if included:
+                    fact = lambda world: world & changed == changed
+                else:
+                    fact = lambda world: world & changed == 0
+                assert _implied(why, fact, worlds, assumptions)
+
+            cmin, cmax = var.card_min, var.card_max
+            assert _implied(
+                var.card_min_reason(),
+                lambda world: world.bit_count() >= cmin,
+                worlds,
+                assumptions,
+            )
+            assert _implied(
+                var.card_max_reason(),
+                lambda world: world.bit_count() <= cmax,
+                worlds,
+                assumptions,
+            )
+            # No world meeting every call so far is pruned
+            for world in worlds:
+                if all(holds(world) for holds in assumptions.values()):
+                    assert world & var._lower_bound == var._lower_bound
+                    assert world & ~var._upper_bound == 0
+                    assert cmin <= world.bit_count() <= cmax
@@ -0,0 +1,124 @@
+from typing import Iterator, Sequence
+
+MAGIC = b"SSTR\x01"
+
+# Event tags
+BRANCH = 0  # variable index, value count, values in the order tried
+RESTART = 1  # number of nodes expanded when the run was cut off
+END = 2  # number of nodes expanded when the search completed
+
+
+def _write_varint(out: bytearray, n: int) -> None:
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    n = shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError("Corrupt trace: truncated integer")
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+class DecisionTrace:
+    """The branching choices and restarts of a search, in compact binary form.
+
+    Each expanded node records its branching variable and the order in which
+    its values were tried; together with the restarts this determines the
+    whole search tree, so ``SetSolver(replay=trace)`` can walk it again
+    without running the heuristics. A search that completes, rather than
+    being interrupted, ends with an end marker. Integers are stored as LEB128
+    varints and variables by their index in ``variables``.
+    """
+
+    def __init__(self, variables: Sequence[str]):
+        self.variables = list(variables)
+        self._index = {name: i for i, name in enumerate(self.variables)}
+        self.data = bytearray()
+
+    def branch(self, var_name: str, values: Sequence[int]) -> None:
+        data = self.data
+        data.append(BRANCH)
+        _write_varint(data, self._index[var_name])
+        _write_varint(data, len(values))
+        for value in values:
+            _write_varint(data, value)
+
+    def restart(self, nodes: int) -> None:
+        self.data.append(RESTART)
+        _write_varint(self.data, nodes)
+
+    def end(self, nodes: int) -> None:
+        self.data.append(END)
+        _write_varint(self.data, nodes)
+
+    @property
+    def complete(self) -> bool:
+        """True when the recorded search completed, false if it was cut short."""
+        return any(event[0] == "end" for event in self.events())
+
+    def events(self) -> Iterator[tuple]:
+        """Yield ("branch", variable, values), ("restart", nodes) and
+        ("end", nodes) events."""
+        data = self.data
+        pos = 0
+        while pos < len(data):
+            tag = data[pos]
+            pos += 1
+            if tag == BRANCH:
+                index, pos = _read_varint(data, pos)
+                count, pos = _read_varint(data, pos)
+                values = []
+                for _ in range(count):
+                    value, pos = _read_varint(data, pos)
+                    values.append(value)
+                yield "branch", self.variables[index], values
+            elif tag == RESTART:
+                nodes, pos = _read_varint(data, pos)
+                yield "restart", nodes
+            elif tag == END:
+                nodes, pos = _read_varint(data, pos)
+                yield "end", nodes
+            else:
+                raise ValueError(f"Corrupt trace: unknown event {tag}")
+
+    def to_bytes(self) -> bytes:
+        header = bytearray(MAGIC)
+        _write_varint(header, len(self.variables))
+        for name in self.variables:
+            encoded = name.encode()
+            _write_varint(header, len(encoded))
+            header += encoded
+        return bytes(header + self.data)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "DecisionTrace":
+        if not data.startswith(MAGIC):
+            raise ValueError("Not a decision trace")
+        pos = len(MAGIC)
+        count, pos = _read_varint(data, pos)
+        names = []
+        for _ in range(count):
+            size, pos = _read_varint(data, pos)
+            names.append(data[pos : pos + size].decode())
+            pos += size
+        trace = cls(names)
+        trace.data = bytearray(data[pos:])
+        return trace
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> "DecisionTrace":
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
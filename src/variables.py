@@ -1,23 +1,340 @@
+from typing import Iterable, Iterator
+
+# Explanation of a domain change or a conflict: groups of literals
+# (variable, is_included, mask) meaning every value of ``mask`` is in
+# (resp. out of) ``variable``. Masks of excluded values may be negative and
+# are read relative to the variable's initial upper bound. None means the
+# propagator cannot explain itself.
+Reason = tuple[tuple[str, bool, int], ...] | None
+
+# Domain events, combined as bit flags
+EVENT_LOWER = 1  # values added to the lower bound
+EVENT_UPPER = 2  # values removed from the upper bound
+EVENT_FIXED = 4  # the variable became determined
+EVENT_CARD = 8  # the cardinality interval was narrowed
+EVENT_ANY = EVENT_LOWER | EVENT_UPPER | EVENT_FIXED | EVENT_CARD
+
+
+class Conflict(ValueError):
+    """A domain wipe-out or constraint violation, with its explanation."""
+
+    def __init__(self, message: str, reason: Reason = None):
+        super().__init__(message)
+        self.reason = reason
+
+
+def join_reasons(*reasons: Reason) -> Reason:
+    """Concatenate reasons; unexplained if any of them is."""
+    joined = ()
+    for reason in reasons:
+        if reason is None:
+            return None
+        joined += reason
+    return joined
+
+
+def to_bitset(values: Iterable[int]) -> int:
+    """Encode a collection of non-negative integers as a bitmask."""
+    mask = 0
+    for value in values:
+        mask |= 1 << value
+    return mask
+
+
+def iter_bitset(mask: int) -> Iterator[int]:
+    """Yield the values of a bitmask in increasing order."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def from_bitset(mask: int) -> set[int]:
+    return set(iter_bitset(mask))
+
+
 class SetVariable:
+    """Set variable with domain [lower_bound ⊆ X ⊆ upper_bound], |X| ∈ [min, max].
 
-    def __init__(self, name, lower_bound=None, upper_bound=None):
+    Both bounds are stored as integer bitmasks over the universe of values
+    (bit i is set when value i belongs to the bound), so set operations on
+    domains are single int operations and cardinalities are popcounts.
+
+    As in Azevedo's Cardinal, the domain also carries a cardinality interval,
+    kept consistent with the bounds: taking every remaining value once the
+    upper bound is as small as the minimum, and dropping them once the lower
+    bound reaches the maximum.
+    """
+
+    __slots__ = (
+        "name",
+        "_lower_bound",
+        "_upper_bound",
+        "_card_min",
+        "_card_max",
+        "_card_reasons",
+        "_trail",
+        "_events",
+    )
+
+    def __init__(
+        self,
+        name,
+        lower_bound=None,
+        upper_bound=None,
+        min_cardinality: int = 0,
+        max_cardinality: int | None = None,
+    ):
         self.name = name
-        self._lower_bound: set[int] = set() if lower_bound is None else set(lower_bound)
-        self._upper_bound: set[int] = set() if upper_bound is None else set(upper_bound)
+        self._lower_bound: int = 0 if lower_bound is None else to_bitset(lower_bound)
+        self._upper_bound: int = 0 if upper_bound is None else to_bitset(upper_bound)
+        # Stated cardinality interval; the bounds may imply a tighter one
+        self._card_min = min_cardinality
+        self._card_max = (
+            self._upper_bound.bit_count()
+            if max_cardinality is None
+            else max_cardinality
+        )
+        # Reasons for the stated minimum and maximum
+        self._card_reasons: tuple[Reason, Reason] = ((), ())
+        # Undo log shared with a trailing StateComputer, None when not trailed.
+        # Entries are (variable, old_lower, old_upper, is_included, mask, reason,
+        # old_card) where old_card is None unless the cardinality interval
+        # changed, in which case it holds (min, max, reasons) to restore
+        self._trail: list | None = None
+        # Events accumulated since the StateComputer last consumed them
+        self._events = 0
 
-        if not self._lower_bound.issubset(self._upper_bound):
+        if self._lower_bound & ~self._upper_bound:
             raise ValueError("Lower bound must be subset of upper bound")
+        if self.card_min > self.card_max:
+            raise ValueError(f"Empty cardinality interval for {self.name}")
+
+    @classmethod
+    def from_bitsets(
+        cls,
+        name,
+        lower_bound: int,
+        upper_bound: int,
+        card_min: int = 0,
+        card_max: int | None = None,
+        card_reasons: tuple[Reason, Reason] = ((), ()),
+    ) -> "SetVariable":
+        var = cls.__new__(cls)
+        var.name = name
+        var._lower_bound = lower_bound
+        var._upper_bound = upper_bound
+        var._card_min = card_min
+        var._card_max = upper_bound.bit_count() if card_max is None else card_max
+        var._card_reasons = card_reasons
+        var._trail = None
+        var._events = 0
+        return var
+
+    def copy(self) -> "SetVariable":
+        return SetVariable.from_bitsets(
+            self.name,
+            self._lower_bound,
+            self._upper_bound,
+            self._card_min,
+            self._card_max,
+            self._card_reasons,
+        )
 
     @property
     def lower_bound(self) -> set[int]:
-        return self._lower_bound.copy()
+        return from_bitset(self._lower_bound)
 
     @property
     def upper_bound(self) -> set[int]:
-        return self._upper_bound.copy()
+        return from_bitset(self._upper_bound)
+
+    @property
+    def undetermined(self) -> int:
+        """Bitmask of the values that are still undecided."""
+        return self._upper_bound & ~self._lower_bound
+
+    @property
+    def card_min(self) -> int:
+        return max(self._card_min, self._lower_bound.bit_count())
+
+    @property
+    def card_max(self) -> int:
+        return min(self._card_max, self._upper_bound.bit_count())
+
+    def card_min_reason(self) -> Reason:
+        """Literals implying ``|X| >= card_min``."""
+        if self._lower_bound.bit_count() >= self._card_min:
+            return ((self.name, True, self._lower_bound),)
+        return self._card_reasons[0]
+
+    def card_max_reason(self) -> Reason:
+        """Literals implying ``|X| <= card_max``."""
+        if self._upper_bound.bit_count() <= self._card_max:
+            return ((self.name, False, ~self._upper_bound),)
+        return self._card_reasons[1]
+
+    def domain_size(self) -> int:
+        return (self._upper_bound & ~self._lower_bound).bit_count()
 
     def is_determined(self):
         return self._lower_bound == self._upper_bound
 
+    def include(self, mask: int, reason: Reason = None) -> bool:
+        """Add the values of ``mask`` to the lower bound, because of ``reason``.
+
+        Returns whether the bound changed; raises Conflict on a domain wipe-out.
+        """
+        new_lower = self._lower_bound | mask
+        if new_lower == self._lower_bound:
+            return False
+        missing = new_lower & ~self._upper_bound
+        if missing:
+            missing &= -missing
+            raise Conflict(
+                f"Cannot include {from_bitset(mask)} in {self.name}: not in upper bound {self.upper_bound}",
+                None if reason is None else reason + ((self.name, False, missing),),
+            )
+        if new_lower.bit_count() > self._card_max:
+            raise Conflict(
+                f"Cannot include {from_bitset(mask)} in {self.name}: more than {self._card_max} values",
+                join_reasons(
+                    reason,
+                    ((self.name, True, self._lower_bound),),
+                    self._card_reasons[1],
+                ),
+            )
+        if self._trail is not None:
+            self._trail.append(
+                (
+                    self,
+                    self._lower_bound,
+                    self._upper_bound,
+                    True,
+                    new_lower & ~self._lower_bound,
+                    reason,
+                    None,
+                )
+            )
+        self._lower_bound = new_lower
+        self._events |= (
+            EVENT_LOWER | EVENT_FIXED if new_lower == self._upper_bound else EVENT_LOWER
+        )
+        if new_lower != self._upper_bound and new_lower.bit_count() == self._card_max:
+            self.restrict(
+                new_lower,
+                join_reasons(self._card_reasons[1], ((self.name, True, new_lower),)),
+            )
+        return True
+
+    def restrict(self, mask: int, reason: Reason = None) -> bool:
+        """Intersect the upper bound with ``mask``, because of ``reason``.
+
+        Returns whether the bound changed; raises Conflict on a domain wipe-out.
+        """
+        new_upper = self._upper_bound & mask
+        if new_upper == self._upper_bound:
+            return False
+        lost = self._lower_bound & ~new_upper
+        if lost:
+            lost &= -lost
+            raise Conflict(
+                f"Cannot restrict {self.name} to {from_bitset(new_upper)}: lower bound is {self.lower_bound}",
+                None if reason is None else reason + ((self.name, True, lost),),
+            )
+        if new_upper.bit_count() < self._card_min:
+            raise Conflict(
+                f"Cannot restrict {self.name} to {from_bitset(new_upper)}: fewer than {self._card_min} values",
+                join_reasons(
+                    reason,
+                    ((self.name, False, ~self._upper_bound),),
+                    self._card_reasons[0],
+                ),
+            )
+        if self._trail is not None:
+            self._trail.append(
+                (
+                    self,
+                    self._lower_bound,
+                    self._upper_bound,
+                    False,
+                    self._upper_bound & ~new_upper,
+                    reason,
+                    None,
+                )
+            )
+        self._upper_bound = new_upper
+        self._events |= (
+            EVENT_UPPER | EVENT_FIXED if new_upper == self._lower_bound else EVENT_UPPER
+        )
+        if new_upper != self._lower_bound and new_upper.bit_count() == self._card_min:
+            self.include(
+                new_upper,
+                join_reasons(self._card_reasons[0], ((self.name, False, ~new_upper),)),
+            )
+        return True
+
+    def exclude(self, mask: int, reason: Reason = None) -> bool:
+        """Remove the values of ``mask`` from the upper bound."""
+        return self.restrict(~mask, reason)
+
+    def bound_cardinality(
+        self, card_min: int = 0, card_max: int | None = None, reason: Reason = None
+    ) -> bool:
+        """Narrow the cardinality interval to ``[card_min, card_max]``.
+
+        Returns whether the interval changed; raises Conflict when it becomes
+        empty. The bounds are then settled as in ``include``/``restrict``.
+        """
+        new_min = max(self._card_min, card_min)
+        new_max = self._card_max if card_max is None else min(self._card_max, card_max)
+        if new_min <= self.card_min and new_max >= self.card_max:
+            return False
+        rmin, rmax = self._card_reasons
+        if new_min > self._card_min:
+            rmin = reason
+        if new_max < self._card_max:
+            rmax = reason
+        lower_size = self._lower_bound.bit_count()
+        upper_size = self._upper_bound.bit_count()
+        if new_min > min(new_max, upper_size) or max(new_min, lower_size) > new_max:
+            raise Conflict(
+                f"Cardinality of {self.name} cannot be in [{new_min}, {new_max}] with bounds [{self.lower_bound} ⊆ X ⊆ {self.upper_bound}]",
+                join_reasons(
+                    rmin,
+                    rmax,
+                    ((self.name, True, self._lower_bound),),
+                    ((self.name, False, ~self._upper_bound),),
+                ),
+            )
+        if self._trail is not None:
+            self._trail.append(
+                (
+                    self,
+                    self._lower_bound,
+                    self._upper_bound,
+                    False,
+                    0,
+                    reason,
+                    (self._card_min, self._card_max, self._card_reasons),
+                )
+            )
+        self._card_min = new_min
+        self._card_max = new_max
+        self._card_reasons = (rmin, rmax)
+        self._events |= EVENT_CARD
+
+        if upper_size == new_min:
+            self.include(
+                self._upper_bound,
+                join_reasons(rmin, ((self.name, False, ~self._upper_bound),)),
+            )
+        elif lower_size == new_max:
+            self.restrict(
+                self._lower_bound,
+                join_reasons(rmax, ((self.name, True, self._lower_bound),)),
+            )
+        return True
+
     def __str__(self):
-        return f"{self.name}: [{self._lower_bound} ⊆ X ⊆ {self._upper_bound}]"
+        return f"{self.name}: [{self.lower_bound} ⊆ X ⊆ {self.upper_bound}]"
@@ -0,0 +1,95 @@
+import math
+
+from src.misc import Operation
+
+_MASK_64 = (1 << 64) - 1
+_FNV_PRIME_64 = 0x100000001B3
+_GOLDEN_64 = 0x9E3779B97F4A7C15
+
+
+def _mix64(x: int) -> int:
+    """splitmix64 finaliser: spreads every input bit over the whole word."""
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK_64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK_64
+    return x ^ (x >> 31)
+
+
+def extend_fingerprint(fingerprint: int, op: Operation, bits: int = 64) -> int:
+    """Fingerprint of ``path + [op]`` given the fingerprint of ``path``.
+
+    The empty path has fingerprint 0. The result is order-sensitive and fits
+    in ``bits`` bits (64 or 128), whatever the length of the path.
+    """
+    key = hash(op) & _MASK_64
+    low = _mix64(((fingerprint & _MASK_64) * _FNV_PRIME_64 + key) & _MASK_64)
+    if bits == 64:
+        return low
+    high = _mix64((((fingerprint >> 64) ^ key) * _FNV_PRIME_64 + _GOLDEN_64) & _MASK_64)
+    return high << 64 | low
+
+
+class VisitedStates:
+    """Exact set of visited path fingerprints."""
+
+    def __init__(self):
+        self._seen: set[int] = set()
+
+    def add(self, fingerprint: int) -> None:
+        self._seen.add(fingerprint)
+
+    def __contains__(self, fingerprint: int) -> bool:
+        return fingerprint in self._seen
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def clear(self) -> None:
+        self._seen.clear()
+
+
+class BloomVisitedStates:
+    """Approximate set of visited path fingerprints backed by a Bloom filter.
+
+    Memory is fixed by ``capacity`` and ``false_positive_rate``. A false
+    positive makes the solver skip a node it never explored, so the search is
+    no longer complete; keep the rate small on instances that must be proven
+    infeasible.
+    """
+
+    def __init__(self, capacity: int = 1_000_000, false_positive_rate: float = 1e-6):
+        if not 0 < false_positive_rate < 1:
+            raise ValueError("false_positive_rate must be in (0, 1)")
+        self.capacity = capacity
+        self.false_positive_rate = false_positive_rate
+        self._size = max(
+            8, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+        )
+        self._hashes = max(1, round(self._size / capacity * math.log(2)))
+        self._bits = bytearray((self._size + 7) // 8)
+        self._count = 0
+
+    def _positions(self, fingerprint: int):
+        # Double hashing over the re-mixed low 64 bits of the fingerprint
+        mixed = _mix64(fingerprint & _MASK_64)
+        h1 = mixed & 0xFFFFFFFF
+        h2 = (mixed >> 32) | 1
+        for i in range(self._hashes):
+            yield (h1 + i * h2) % self._size
+
+    def add(self, fingerprint: int) -> None:
+        for pos in self._positions(fingerprint):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self._count += 1
+
+    def __contains__(self, fingerprint: int) -> bool:
+        return all(
+            self._bits[pos >> 3] & (1 << (pos & 7))
+            for pos in self._positions(fingerprint)
+        )
+
+    def __len__(self) -> int:
+        return self._count
+
+    def clear(self) -> None:
+        self._bits = bytearray(len(self._bits))
+        self._count = 0